@@ -1,8 +1,9 @@
 import base64
+import json
 import logging
 from datetime import datetime
 from fastapi import APIRouter, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 from config import (
     PAYME_SECRET_KEY,
@@ -11,23 +12,23 @@ from config import (
     PAYME_MERCHANT_ID
 )
 from services.payme_service import (
-    create_order,
+    create_payme_transaction,
     get_order_by_id,
     get_order_by_payme_id,
-    get_pending_order_by_user,
-    update_order_state,
+    resolve_account,
     set_order_perform_time,
     set_order_cancel_time,
-    get_orders_by_time_range
+    iter_orders_by_time_range
 )
-from services.user_service import get_user
-from services.course_service import get_course, get_active_course
 
 # Logger
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# GetStatement javobida bir bo'lakdagi tranzaksiyalar soni
+STATEMENT_CHUNK_SIZE = 100
+
 
 # Payme error kodlari
 class PaymeError:
@@ -41,6 +42,7 @@ class PaymeError:
     METHOD_NOT_FOUND = -32601
     INVALID_AUTH = -32504
     PARSE_ERROR = -32700
+    SYSTEM_ERROR = -32400
 
 
 def error_response(code: int, message: str, data: str = None) -> dict:
@@ -140,60 +142,73 @@ async def payme_webhook(request: Request):
     else:
         result = error_response(PaymeError.METHOD_NOT_FOUND, f"Method '{method}' not found")
 
+    # GetStatement tayyor oqimli javob qaytaradi
+    if isinstance(result, Response):
+        return result
+
     return JSONResponse(content=result, status_code=200)
 
 
-async def check_perform_transaction(params: dict) -> dict:
-    """To'lov qilish mumkinmi tekshirish"""
-    account = params.get("account", {})
-    amount = params.get("amount")
+async def validate_account(account: dict, amount) -> tuple:
+    """User, kurs, summa va pending tranzaksiyani bitta so'rovda tekshirish
+
+    Natija: (error_response yoki None, account_info)
+    """
     user_id = account.get("user_id")
     course_id = account.get("course_id")
 
-    logger.info(f"CheckPerformTransaction: user_id={user_id}, course_id={course_id}, amount={amount}")
-
     # User ID tekshirish
     if not user_id:
-        return error_response(PaymeError.INVALID_ACCOUNT, "User ID not found")
+        return error_response(PaymeError.INVALID_ACCOUNT, "User ID not found"), None
 
     # User ID raqammi tekshirish
     try:
         user_id_int = int(user_id)
     except ValueError:
-        return error_response(PaymeError.INVALID_ACCOUNT, "Invalid user ID format")
+        return error_response(PaymeError.INVALID_ACCOUNT, "Invalid user ID format"), None
 
-    # User bazada bormi tekshirish
-    user = await get_user(user_id_int)
-    if not user:
-        return error_response(PaymeError.USER_NOT_FOUND, "User not found")
+    # Kurs ID noto'g'ri bo'lsa aktiv kurs olinadi
+    try:
+        course_id_int = int(course_id) if course_id else None
+    except ValueError:
+        course_id_int = None
 
-    # Kurs tekshirish
-    if course_id:
-        try:
-            course_id_int = int(course_id)
-            course = await get_course(course_id_int)
-        except ValueError:
-            course = await get_active_course()
-    else:
-        course = await get_active_course()
+    account_info = await resolve_account(user_id_int, course_id_int)
+
+    # User bazada bormi tekshirish
+    if not account_info['user_exists']:
+        return error_response(PaymeError.USER_NOT_FOUND, "User not found"), None
 
-    if not course:
-        return error_response(PaymeError.COURSE_NOT_FOUND, "Course not found")
+    if account_info['course_id'] is None:
+        return error_response(PaymeError.COURSE_NOT_FOUND, "Course not found"), None
 
     # Summa tekshirish (kurs narxi bilan)
-    if amount != course['price']:
+    if amount != account_info['course_price']:
         return error_response(
             PaymeError.INVALID_AMOUNT,
-            f"Invalid amount. Expected {course['price']}, got {amount}"
-        )
+            f"Invalid amount. Expected {account_info['course_price']}, got {amount}"
+        ), None
+
+    return None, account_info
+
+
+async def check_perform_transaction(params: dict) -> dict:
+    """To'lov qilish mumkinmi tekshirish"""
+    account = params.get("account", {})
+    amount = params.get("amount")
+
+    logger.info(
+        f"CheckPerformTransaction: user_id={account.get('user_id')}, "
+        f"course_id={account.get('course_id')}, amount={amount}"
+    )
+
+    error, account_info = await validate_account(account, amount)
+    if error:
+        return error
 
     # Shu user va kurs uchun pending tranzaksiya bormi
-    try:
-        pending_order = await get_pending_order_by_user(user_id_int, course['id'])
-        if pending_order:
-            return error_response(PaymeError.ORDER_NOT_FOUND, "Another transaction in progress")
-    except Exception as e:
-        logger.error(f"Check pending order error: {e}")
+    if account_info['has_pending']:
+        return error_response(PaymeError.ORDER_NOT_FOUND, "Another transaction in progress")
 
     return success_response({"allow": True})
 
@@ -203,76 +218,39 @@ async def create_transaction(params: dict) -> dict:
     payme_id = params.get("id")
     account = params.get("account", {})
     amount = params.get("amount")
-    time_param = params.get("time")
-    user_id = account.get("user_id")
-    course_id = account.get("course_id")
 
-    logger.info(f"CreateTransaction: user_id={user_id}, course_id={course_id}, payme_id={payme_id}, amount={amount}")
+    logger.info(
+        f"CreateTransaction: user_id={account.get('user_id')}, course_id={account.get('course_id')}, "
+        f"payme_id={payme_id}, amount={amount}"
+    )
 
-    # User ID tekshirish
-    if not user_id:
-        return error_response(PaymeError.INVALID_ACCOUNT, "User ID not found")
+    error, account_info = await validate_account(account, amount)
+    if error:
+        return error
 
-    # User ID raqammi tekshirish
     try:
-        user_id_int = int(user_id)
-    except ValueError:
-        return error_response(PaymeError.INVALID_ACCOUNT, "Invalid user ID format")
-
-    # User bazada bormi tekshirish
-    user = await get_user(user_id_int)
-    if not user:
-        return error_response(PaymeError.USER_NOT_FOUND, "User not found")
-
-    # Kurs tekshirish
-    if course_id:
-        try:
-            course_id_int = int(course_id)
-            course = await get_course(course_id_int)
-        except ValueError:
-            course = await get_active_course()
-    else:
-        course = await get_active_course()
-
-    if not course:
-        return error_response(PaymeError.COURSE_NOT_FOUND, "Course not found")
-
-    # Summa tekshirish
-    if amount != course['price']:
-        return error_response(PaymeError.INVALID_AMOUNT, "Invalid amount")
+        # Mavjud/pending tekshiruvi va yaratish bitta atomar tranzaksiyada
+        status, order = await create_payme_transaction(
+            payme_id, account_info['user_id'], account_info['course_id'], amount
+        )
 
-    try:
-        # Mavjud tranzaksiya bormi (shu payme_id bilan)
-        existing = await get_order_by_payme_id(payme_id)
-        if existing:
+        if status == 'exists':
             # Agar bekor qilingan bo'lsa
-            if existing['state'] in [-1, -2]:
+            if order['state'] in [-1, -2]:
                 return error_response(PaymeError.CANT_PERFORM, "Transaction cancelled")
 
             return success_response({
-                "create_time": timestamp_to_ms(existing['created_at']),
-                "transaction": str(existing['id']),
-                "state": existing['state']
+                "create_time": order['create_time'],
+                "transaction": str(order['id']),
+                "state": order['state']
             })
 
-        # Shu user va kurs uchun pending tranzaksiya bormi
-        pending_order = await get_pending_order_by_user(user_id_int, course['id'])
-        if pending_order:
-            # Agar boshqa tranzaksiya band qilgan bo'lsa
-            if pending_order['payme_transaction_id'] != payme_id:
-                return error_response(PaymeError.ORDER_NOT_FOUND, "Another transaction in progress")
-
-        # Yangi order yaratish (course_id bilan)
-        order_id = await create_order(user_id_int, amount, course['id'])
-        logger.info(f"Order created: {order_id}")
-
-        # Payme ID ni saqlash
-        await update_order_state(order_id, 1, payme_id)
-
-        order = await get_order_by_id(order_id)
+        # Shu user va kurs uchun boshqa tranzaksiya band qilgan
+        if status == 'busy':
+            return error_response(PaymeError.ORDER_NOT_FOUND, "Another transaction in progress")
 
         return success_response({
-            "create_time": timestamp_to_ms(order['created_at']),
+            "create_time": order['create_time'],
             "transaction": str(order['id']),
             "state": 1
         })
@@ -306,13 +284,10 @@ async def perform_transaction(params: dict) -> dict:
         if order['state'] in [-1, -2]:
             return error_response(PaymeError.CANT_PERFORM, "Transaction cancelled")
 
-        # To'lovni tasdiqlash
+        # To'lovni tasdiqlash (xabar outbox orqali fonda yuboriladi)
         await set_order_perform_time(order['order_id'])
         logger.info(f"Payment confirmed for user: {order['user_id']}, course: {order['course_id']}")
 
-        # Foydalanuvchiga xabar yuborish (kurs bo'yicha)
-        await send_success_message(order['user_id'], order['course_id'])
-
         order = await get_order_by_id(order['order_id'])
 
         return success_response({
@@ -381,7 +356,7 @@ async def check_transaction(params: dict) -> dict:
             return error_response(PaymeError.TRANSACTION_NOT_FOUND, "Transaction not found")
 
         return success_response({
-            "create_time": timestamp_to_ms(order['created_at']),
+            "create_time": order['create_time'],
             "perform_time": timestamp_to_ms(order['perform_time']),
             "cancel_time": timestamp_to_ms(order['cancel_time']),
             "transaction": str(order['id']),
@@ -394,100 +369,76 @@ async def check_transaction(params: dict) -> dict:
         return error_response(PaymeError.TRANSACTION_NOT_FOUND, "Internal error")
 
 
-async def get_statement(params: dict) -> dict:
-    """Hisobot olish"""
-    from_time = params.get("from")
-    to_time = params.get("to")
-
-    logger.info(f"GetStatement: from={from_time}, to={to_time}")
+def statement_item(order) -> dict:
+    """GetStatement uchun bitta tranzaksiya"""
+    return {
+        "id": order['payme_transaction_id'],
+        "time": order['create_time'],
+        "amount": order['amount'],
+        "account": {
+            "user_id": str(order['user_id']),
+            "course_id": str(order['course_id']) if order['course_id'] else None
+        },
+        "create_time": order['create_time'],
+        "perform_time": timestamp_to_ms(order['perform_time']),
+        "cancel_time": timestamp_to_ms(order['cancel_time']),
+        "transaction": str(order['id']),
+        "state": order['state'],
+        "reason": order['reason']
+    }
 
-    try:
-        orders = await get_orders_by_time_range(from_time, to_time)
-
-        transactions = []
-        for order in orders:
-            transactions.append({
-                "id": order['payme_transaction_id'],
-                "time": timestamp_to_ms(order['created_at']),
-                "amount": order['amount'],
-                "account": {
-                    "user_id": str(order['user_id']),
-                    "course_id": str(order['course_id']) if order['course_id'] else None
-                },
-                "create_time": timestamp_to_ms(order['created_at']),
-                "perform_time": timestamp_to_ms(order['perform_time']),
-                "cancel_time": timestamp_to_ms(order['cancel_time']),
-                "transaction": str(order['id']),
-                "state": order['state'],
-                "reason": order['reason']
-            })
 
-        logger.info(f"GetStatement: found {len(transactions)} transactions")
-        return success_response({"transactions": transactions})
+async def stream_statement(orders, first):
+    """Tranzaksiyalarni kursordan to'g'ridan-to'g'ri JSON javobga yozish"""
+    yield '{"result": {"transactions": ['
 
+    count = 0
+    chunk = []
+    try:
+        if first is not None:
+            chunk.append(json.dumps(statement_item(first), ensure_ascii=False))
+        async for order in orders:
+            chunk.append(json.dumps(statement_item(order), ensure_ascii=False))
+            if len(chunk) >= STATEMENT_CHUNK_SIZE:
+                yield (',' if count else '') + ','.join(chunk)
+                count += len(chunk)
+                chunk = []
     except Exception as e:
-        logger.error(f"GetStatement error: {e}")
-        return success_response({"transactions": []})
+        # Javob boshlangan - JSON ni yopmaymiz, ulanish uziladi va Payme
+        # chala hisobotni to'liq deb qabul qilmaydi
+        logger.error(f"GetStatement error after {count} transactions: {e}")
+        raise
+    finally:
+        await orders.aclose()
 
+    if chunk:
+        yield (',' if count else '') + ','.join(chunk)
+        count += len(chunk)
 
-async def send_success_message(user_id: int, course_id: int = None):
-    """Muvaffaqiyatli to'lov haqida xabar yuborish"""
-    try:
-        from main import get_bot
-        bot_app = get_bot()
+    yield ']}}'
+    logger.info(f"GetStatement: sent {count} transactions")
 
-        if bot_app is None:
-            logger.error("Bot app not found")
-            return
 
-        # Kurs ma'lumotlarini olish
-        if course_id:
-            course = await get_course(course_id)
-        else:
-            course = await get_active_course()
-
-        if not course:
-            logger.error("Course not found for success message")
-            return
+async def get_statement(params: dict):
+    """Hisobot olish"""
+    from_time = params.get("from")
+    to_time = params.get("to")
 
-        channel_id = course['channel_id']
-        channel_url = course['channel_url']
+    logger.info(f"GetStatement: from={from_time}, to={to_time}")
 
-        # Bir martalik invite link yaratish
-        invite_link = None
-        try:
-            invite = await bot_app.bot.create_chat_invite_link(
-                chat_id=int(channel_id),
-                member_limit=1
-            )
-            invite_link = invite.invite_link
-            logger.info(f"Invite link created for user: {user_id}, course: {course_id}")
-        except Exception as e:
-            logger.error(f"Invite link yaratishda xato: {e}")
-            # Agar invite link yaratilmasa, channel_url ishlatiladi
-            invite_link = channel_url
-
-        # Xabar yuborish
-        if invite_link:
-            text = (
-                f"🎉 <b>Tabriklaymiz!</b>\n\n"
-                f"Siz <b>{course['name']}</b> kursiga muvaffaqiyatli to'lov qildingiz!\n\n"
-                f"🔗 Yopiq kanalga kirish uchun link:\n{invite_link}\n\n"
-                f"⚠️ Link faqat bir martalik!"
-            )
-        else:
-            text = (
-                f"🎉 <b>Tabriklaymiz!</b>\n\n"
-                f"Siz <b>{course['name']}</b> kursiga muvaffaqiyatli to'lov qildingiz!\n\n"
-                f"⚠️ Admin siz bilan tez orada bog'lanadi."
-            )
-
-        await bot_app.bot.send_message(
-            chat_id=user_id,
-            text=text,
-            parse_mode='HTML'
-        )
-        logger.info(f"Success message sent to user: {user_id}")
+    try:
+        from_time = int(from_time)
+        to_time = int(to_time)
+    except (TypeError, ValueError):
+        return success_response({"transactions": []})
 
+    # Birinchi qatorni oldindan o'qiymiz - so'rov xatosi oddiy xato javobi bo'ladi
+    orders = iter_orders_by_time_range(from_time, to_time)
+    try:
+        first = await anext(orders, None)
     except Exception as e:
-        logger.error(f"Xabar yuborishda xato: {e}")
\ No newline at end of file
+        logger.error(f"GetStatement error: {e}")
+        await orders.aclose()
+        return error_response(PaymeError.SYSTEM_ERROR, "Internal error")
+
+    return StreamingResponse(stream_statement(orders, first), media_type="application/json")
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+Excel export benchmark: vaqt, eng yuqori RSS va export paytida event loop qanchalik to'xtab qolgani.
+
+Har bir hajm alohida jarayonda o'lchanadi (peak RSS boshqa o'lchovlarga aralashmasligi uchun).
+
+Ishga tushirish:
+    python benchmarks/excel_export_bench.py --sizes 100000,1000000
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if "DB_PATH" not in os.environ:
+    os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="excel_bench_"), "bench.db")
+os.environ.setdefault("OWNER_ID", "0")
+
+from database.connection import init_db, close_db  # noqa: E402
+from database.models import run_migrations  # noqa: E402
+from utils.export_utils import export_to_excel  # noqa: E402
+
+TICK = 0.01
+
+
+def fill_users(path: str, total: int):
+    """users jadvalini kerakli hajmgacha to'ldirish (sinxron, tez)"""
+    conn = sqlite3.connect(path)
+    existing = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    rows = (
+        (1_000_000_000 + i, f"Ism{i}", f"Familiya{i}", f"user_{i}")
+        for i in range(existing, total)
+    )
+    conn.executemany(
+        'INSERT INTO users (chat_id, first_name, last_name, username) VALUES (?, ?, ?, ?)',
+        rows
+    )
+    conn.commit()
+    conn.close()
+
+
+async def measure() -> tuple:
+    """Export vaqti, fayl hajmi va event loop ning eng uzun kechikishi"""
+    stall = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal stall
+        while running:
+            started = time.perf_counter()
+            await asyncio.sleep(TICK)
+            stall = max(stall, time.perf_counter() - started - TICK)
+
+    ticker_task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    with await export_to_excel() as document:
+        size = document.seek(0, os.SEEK_END)
+    elapsed = time.perf_counter() - started
+    running = False
+    await ticker_task
+    return elapsed, size, stall
+
+
+def child(total: int):
+    elapsed, size, stall = asyncio.run(measure())
+    # Linux da ru_maxrss kilobaytda
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{total:>10} | {elapsed:>8.2f} | {peak_rss:>9.1f} | {size / 1024 / 1024:>8.1f} | {stall * 1000:>9.1f}")
+
+
+async def prepare():
+    await init_db()
+    await run_migrations()
+    await close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="100000,1000000")
+    parser.add_argument("--child", type=int)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    asyncio.run(prepare())
+
+    print(f"{'users':>10} | {'time s':>8} | {'peak MB':>9} | {'file MB':>8} | {'stall ms':>9}")
+    print("-" * 57)
+    for total in sorted(int(size) for size in args.sizes.split(",")):
+        fill_users(os.environ["DB_PATH"], total)
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--child", str(total)], check=True)
+
+
+if __name__ == "__main__":
+    main()
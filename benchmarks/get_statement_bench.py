@@ -0,0 +1,85 @@
+"""
+GetStatement benchmark: javob vaqti oyna hajmiga bog'liq bo'lishi kerak, jami tranzaksiyalar soniga emas.
+
+Ishga tushirish:
+    python benchmarks/get_statement_bench.py --sizes 10000,100000,1000000 --window 1000
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TMP_DIR = tempfile.mkdtemp(prefix="statement_bench_")
+os.environ["DB_PATH"] = os.path.join(TMP_DIR, "bench.db")
+os.environ.setdefault("OWNER_ID", "0")
+
+from database.connection import init_db, close_db  # noqa: E402
+from database.models import run_migrations  # noqa: E402
+from api.payme import stream_statement  # noqa: E402
+
+START_MS = 1_700_000_000_000
+STEP_MS = 60_000  # har daqiqada bitta tranzaksiya
+
+
+def fill_ledger(path: str, total: int):
+    """Jadvalni kerakli hajmgacha to'ldirish (sinxron, tez)"""
+    conn = sqlite3.connect(path)
+    existing = conn.execute('SELECT COUNT(*) FROM payme_transactions').fetchone()[0]
+    rows = (
+        (i % 5000, f"order{i}", f"payme{i}", 9_700_000, 2, 1, START_MS + i * STEP_MS)
+        for i in range(existing, total)
+    )
+    conn.executemany('''
+        INSERT INTO payme_transactions
+            (user_id, order_id, payme_transaction_id, amount, state, course_id, create_time)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+
+
+async def measure(total: int, window: int, repeats: int) -> tuple:
+    # Oyna jadval o'rtasidan olinadi
+    from_time = START_MS + (total // 2) * STEP_MS
+    to_time = from_time + (window - 1) * STEP_MS
+
+    best = None
+    size = 0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        size = 0
+        async for part in stream_statement(from_time, to_time):
+            size += len(part)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, size
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--window", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    await init_db()
+    await run_migrations()
+
+    print(f"{'ledger':>10} | {'window':>7} | {'best ms':>9} | {'bytes':>9}")
+    print("-" * 46)
+    for total in sorted(int(size) for size in args.sizes.split(",")):
+        fill_ledger(os.environ["DB_PATH"], total)
+        best, size = await measure(total, args.window, args.repeats)
+        print(f"{total:>10} | {args.window:>7} | {best * 1000:>9.2f} | {size:>9}")
+
+    await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
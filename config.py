@@ -1,8 +1,12 @@
 import os
+from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Vaqt zonasi (rejalashtirilgan reklamalar uchun)
+TIMEZONE = ZoneInfo(os.getenv("TIMEZONE", "Asia/Tashkent"))
+
 # Bot
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 BOT_NAME = os.getenv("BOT_NAME", "Fanur Group Bot")
@@ -20,6 +24,19 @@ ADMIN_USERNAME = os.getenv("ADMIN_USERNAME")
 
 # Database
 DB_PATH = os.getenv("DB_PATH", "bot.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 4))
+
+# Foydalanuvchilarni guruhlab yozish (/start uchun)
+USER_BUFFER_INTERVAL = float(os.getenv("USER_BUFFER_INTERVAL", 0.05))
+USER_BUFFER_SIZE = int(os.getenv("USER_BUFFER_SIZE", 500))
+
+# Sozlamalar keshi (boshqa jarayon o'zgarishlarini olish uchun, soniya)
+SETTINGS_REFRESH_INTERVAL = float(os.getenv("SETTINGS_REFRESH_INTERVAL", 30))
+
+# Oldindan yaratilgan bir martalik invite linklar puli (har bir kurs uchun)
+INVITE_POOL_LOW = int(os.getenv("INVITE_POOL_LOW", 20))
+INVITE_POOL_TARGET = int(os.getenv("INVITE_POOL_TARGET", 100))
+INVITE_POOL_INTERVAL = float(os.getenv("INVITE_POOL_INTERVAL", 60))
 
 # Payme
 PAYME_MERCHANT_ID = os.getenv("PAYME_MERCHANT_ID")
@@ -29,8 +46,18 @@ PAYME_TEST_MODE = os.getenv("PAYME_TEST_MODE", "false").lower() == "true"
 PAYME_CHECKOUT_URL = os.getenv("PAYME_CHECKOUT_URL", "https://checkout.paycom.uz")
 PAYME_TEST_CHECKOUT_URL = os.getenv("PAYME_TEST_CHECKOUT_URL", "https://test.paycom.uz")
 
-# Broadcast
-BROADCAST_DELAY = float(os.getenv("BROADCAST_DELAY", 0.05))
+# Bir vaqtda qayta ishlanadigan update lar (bitta chat ichida tartib saqlanadi)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", 64))
+
+# Telegram limitlari: sekundiga jami xabarlar va bitta chatga xabarlar
+TELEGRAM_RATE = float(os.getenv("TELEGRAM_RATE", 30))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", 1))
+
+# Broadcast: parallel yuboruvchilar soni va sekundiga xabarlar limiti
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 25))
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", 10))
+# Har partiyadan keyin natijalar bazaga yoziladi (restartdan keyin shu joydan davom etadi)
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", 200))
 
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
\ No newline at end of file
@@ -1,2 +1,2 @@
-from database.connection import get_db
-from database.models import create_tables
\ No newline at end of file
+from database.connection import db, init_db, close_db, get_db, transaction
+from database.models import run_migrations
\ No newline at end of file
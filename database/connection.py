@@ -1,5 +1,141 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
 import aiosqlite
-from config import DB_PATH
+from config import DB_PATH, DB_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Joriy task ichida ochilgan yozish tranzaksiyasi (ichma-ich chaqiruvlar uchun)
+_current_writer: ContextVar = ContextVar('current_writer', default=None)
+
+
+class Database:
+    """SQLite ulanishlar puli: bitta yozuvchi va bir nechta o'quvchi ulanish"""
+
+    def __init__(self, path: str, readers: int = 4):
+        self.path = path
+        self.readers_count = max(1, readers)
+        self._writer = None
+        self._readers = []
+        self._idle = None
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path)
+        conn.row_factory = aiosqlite.Row
+        for pragma in ('PRAGMA busy_timeout = 5000', 'PRAGMA synchronous = NORMAL'):
+            async with conn.execute(pragma):
+                pass
+        return conn
+
+    async def open(self):
+        """Ulanishlarni ochish (lifespan startup)"""
+        async with self._open_lock:
+            if self.is_open:
+                return
+
+            writer = await self._connect()
+            # WAL rejimida o'quvchilar yozuvchini bloklamaydi
+            async with writer.execute('PRAGMA journal_mode = WAL'):
+                pass
+
+            idle = asyncio.Queue()
+            readers = []
+            for _ in range(self.readers_count):
+                reader = await self._connect()
+                readers.append(reader)
+                idle.put_nowait(reader)
+
+            self._writer = writer
+            self._readers = readers
+            self._idle = idle
+            logger.info(f"Database pool opened: 1 writer, {len(readers)} readers")
+
+    async def close(self):
+        """Barcha ulanishlarni yopish (lifespan shutdown)"""
+        async with self._open_lock:
+            if not self.is_open:
+                return
+
+            async with self._write_lock:
+                for conn in self._readers:
+                    await conn.close()
+                await self._writer.close()
+
+            self._writer = None
+            self._readers = []
+            self._idle = None
+            logger.info("Database pool closed")
+
+    @asynccontextmanager
+    async def read(self):
+        """O'qish uchun ulanish olish"""
+        # Yozish tranzaksiyasi ichida o'z yozuvlarimizni ko'rish uchun
+        writer = _current_writer.get()
+        if writer is not None:
+            yield writer
+            return
+
+        if not self.is_open:
+            await self.open()
+
+        idle = self._idle
+        conn = await idle.get()
+        try:
+            yield conn
+        finally:
+            idle.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self):
+        """Yozish tranzaksiyasi: muvaffaqiyatda commit, xatoda rollback"""
+        writer = _current_writer.get()
+        if writer is not None:
+            # Tashqi tranzaksiya ichida - commit tashqarida bo'ladi
+            yield writer
+            return
+
+        if not self.is_open:
+            await self.open()
+
+        async with self._write_lock:
+            conn = self._writer
+            token = _current_writer.set(conn)
+            try:
+                await conn.execute('BEGIN IMMEDIATE')
+                yield conn
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+            finally:
+                _current_writer.reset(token)
+
+
+db = Database(DB_PATH, DB_POOL_SIZE)
+
+
+async def init_db():
+    await db.open()
+
+
+async def close_db():
+    await db.close()
+
+
+def get_db():
+    """O'qish uchun ulanish: async with get_db() as db"""
+    return db.read()
+
 
-async def get_db():
-    return await aiosqlite.connect(DB_PATH)
\ No newline at end of file
+def transaction():
+    """Yozish tranzaksiyasi: async with transaction() as db"""
+    return db.write()
@@ -1,156 +1,448 @@
-import aiosqlite
 import logging
-from config import DB_PATH
+from database.connection import get_db, transaction
 
 logger = logging.getLogger(__name__)
 
 
-async def create_tables():
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Users jadvali
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id INTEGER UNIQUE NOT NULL,
-                first_name TEXT,
-                last_name TEXT,
-                username TEXT,
-                joined_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                is_active INTEGER DEFAULT 1
-            )
-        ''')
-
-        # Users indexlar
-        await db.execute('CREATE INDEX IF NOT EXISTS idx_users_chat_id ON users(chat_id)')
-        await db.execute('CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)')
-        await db.execute('CREATE INDEX IF NOT EXISTS idx_users_is_active ON users(is_active)')
-
-        # Admins jadvali
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS admins (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id INTEGER UNIQUE NOT NULL,
-                added_by INTEGER,
-                added_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # Admins index
-        await db.execute('CREATE INDEX IF NOT EXISTS idx_admins_chat_id ON admins(chat_id)')
-
-        # Settings jadvali
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS settings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                key TEXT UNIQUE NOT NULL,
-                value TEXT
-            )
-        ''')
-
-        # Settings index
-        await db.execute('CREATE INDEX IF NOT EXISTS idx_settings_key ON settings(key)')
-
-        # Broadcasts jadvali
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS broadcasts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                message_type TEXT,
-                sent_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                total_users INTEGER,
-                success INTEGER,
-                failed INTEGER
-            )
-        ''')
-
-        # Payments jadvali (karta orqali to'lovlar)
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS payments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id INTEGER NOT NULL,
-                amount INTEGER DEFAULT 97000,
-                status TEXT DEFAULT 'pending',
-                screenshot_file_id TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                confirmed_at DATETIME,
-                confirmed_by INTEGER
-            )
-        ''')
-
-        # Payments indexlar
-        await db.execute('CREATE INDEX IF NOT EXISTS idx_payments_chat_id ON payments(chat_id)')
-        await db.execute('CREATE INDEX IF NOT EXISTS idx_payments_status ON payments(status)')
-
-        # Courses jadvali (YANGI)
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS courses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                description TEXT,
-                welcome_text TEXT,
-                price INTEGER NOT NULL,
-                channel_id TEXT NOT NULL,
-                channel_url TEXT,
-                is_active INTEGER DEFAULT 0,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # Courses index
-        await db.execute('CREATE INDEX IF NOT EXISTS idx_courses_is_active ON courses(is_active)')
-
-        # Payme transactions jadvali (eski - course_id yo'q)
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS payme_transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                order_id TEXT UNIQUE NOT NULL,
-                payme_transaction_id TEXT,
-                amount INTEGER NOT NULL,
-                state INTEGER DEFAULT 0,
-                reason INTEGER,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                perform_time DATETIME,
-                cancel_time DATETIME
-            )
-        ''')
-
-        # Migration - course_id ustunini qo'shish (agar yo'q bo'lsa)
-        try:
-            await db.execute('ALTER TABLE payme_transactions ADD COLUMN course_id INTEGER')
-            logger.info("Migration: course_id column added to payme_transactions")
-        except Exception:
-            # Ustun allaqachon mavjud
-            pass
-
-        # Payme transactions indexlar
-        await db.execute('CREATE INDEX IF NOT EXISTS idx_payme_user_id ON payme_transactions(user_id)')
-        await db.execute('CREATE INDEX IF NOT EXISTS idx_payme_order_id ON payme_transactions(order_id)')
-        await db.execute(
-            'CREATE INDEX IF NOT EXISTS idx_payme_transaction_id ON payme_transactions(payme_transaction_id)')
-        await db.execute('CREATE INDEX IF NOT EXISTS idx_payme_state ON payme_transactions(state)')
-
-        # course_id index (agar ustun mavjud bo'lsa)
-        try:
-            await db.execute('CREATE INDEX IF NOT EXISTS idx_payme_course_id ON payme_transactions(course_id)')
-        except Exception:
-            pass
-
-        # Default settings
-        await db.execute('''
-            INSERT OR IGNORE INTO settings (key, value) VALUES ('force_subscribe', 'off')
-        ''')
-
-        await db.commit()
-        logger.info("Database tables and indexes created successfully")
-
-
-async def migrate_add_course_id():
-    """Eski payme_transactions jadvaliga course_id qo'shish (backup funksiya)"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        try:
-            await db.execute('ALTER TABLE payme_transactions ADD COLUMN course_id INTEGER')
-            await db.commit()
-            logger.info("Migration: course_id column added")
-        except Exception as e:
-            # Ustun allaqachon mavjud
-            logger.debug(f"Migration skipped: {e}")
\ No newline at end of file
+async def _column_exists(db, table: str, column: str) -> bool:
+    async with db.execute(f'PRAGMA table_info({table})') as cursor:
+        return any(row['name'] == column for row in await cursor.fetchall())
+
+
+async def _add_column(db, table: str, column: str, definition: str):
+    """Ustun qo'shish (agar yo'q bo'lsa). SQLite da ADD COLUMN jadvalni qayta yozmaydi"""
+    if not await _column_exists(db, table, column):
+        await db.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+async def _migration_1_initial(db):
+    """Boshlang'ich sxema (eski bazalarda jadvallar allaqachon mavjud bo'lishi mumkin)"""
+    # Users jadvali
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER UNIQUE NOT NULL,
+            first_name TEXT,
+            last_name TEXT,
+            username TEXT,
+            joined_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            is_active INTEGER DEFAULT 1
+        )
+    ''')
+
+    # Users indexlar
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_users_chat_id ON users(chat_id)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_users_is_active ON users(is_active)')
+
+    # Admins jadvali
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS admins (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER UNIQUE NOT NULL,
+            added_by INTEGER,
+            added_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Admins index
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_admins_chat_id ON admins(chat_id)')
+
+    # Settings jadvali
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT UNIQUE NOT NULL,
+            value TEXT
+        )
+    ''')
+
+    # Settings index
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_settings_key ON settings(key)')
+
+    # Broadcasts jadvali
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            message_type TEXT,
+            sent_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            total_users INTEGER,
+            success INTEGER,
+            failed INTEGER
+        )
+    ''')
+
+    # Payments jadvali (karta orqali to'lovlar)
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            amount INTEGER DEFAULT 97000,
+            status TEXT DEFAULT 'pending',
+            screenshot_file_id TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            confirmed_at DATETIME,
+            confirmed_by INTEGER
+        )
+    ''')
+
+    # Payments indexlar
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_payments_chat_id ON payments(chat_id)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_payments_status ON payments(status)')
+
+    # Courses jadvali
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS courses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            welcome_text TEXT,
+            price INTEGER NOT NULL,
+            channel_id TEXT NOT NULL,
+            channel_url TEXT,
+            is_active INTEGER DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Courses index
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_courses_is_active ON courses(is_active)')
+
+    # Payme transactions jadvali (course_id keyingi migratsiyada qo'shiladi)
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS payme_transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            order_id TEXT UNIQUE NOT NULL,
+            payme_transaction_id TEXT,
+            amount INTEGER NOT NULL,
+            state INTEGER DEFAULT 0,
+            reason INTEGER,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            perform_time DATETIME,
+            cancel_time DATETIME
+        )
+    ''')
+
+    # Payme transactions indexlar
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_payme_user_id ON payme_transactions(user_id)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_payme_order_id ON payme_transactions(order_id)')
+    await db.execute(
+        'CREATE INDEX IF NOT EXISTS idx_payme_transaction_id ON payme_transactions(payme_transaction_id)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_payme_state ON payme_transactions(state)')
+
+    # Default settings
+    await db.execute('''
+        INSERT OR IGNORE INTO settings (key, value) VALUES ('force_subscribe', 'off')
+    ''')
+
+
+async def _migration_2_payme_course_id(db):
+    """payme_transactions jadvaliga course_id qo'shish"""
+    await _add_column(db, 'payme_transactions', 'course_id', 'INTEGER')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_payme_course_id ON payme_transactions(course_id)')
+
+
+async def _migration_3_channel_members(db):
+    """Kanal a'zolari (majburiy obuna tekshiruvi uchun lokal nusxa)"""
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS channel_members (
+            channel_id TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (channel_id, user_id)
+        ) WITHOUT ROWID
+    ''')
+
+
+async def _migration_4_users_daily(db):
+    """Kunlik foydalanuvchilar statistikasi (triggerlar orqali yangilanadi)"""
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS users_daily (
+            day TEXT PRIMARY KEY,
+            joined INTEGER NOT NULL DEFAULT 0,
+            active INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+
+    # Yangi foydalanuvchi
+    await db.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_users_daily_insert AFTER INSERT ON users
+        BEGIN
+            INSERT INTO users_daily (day, joined, active)
+            VALUES (DATE(NEW.joined_at), 1, NEW.is_active = 1)
+            ON CONFLICT(day) DO UPDATE SET
+                joined = joined + 1,
+                active = active + (NEW.is_active = 1);
+        END
+    ''')
+
+    # Aktivlik o'zgarishi
+    await db.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_users_daily_status AFTER UPDATE OF is_active ON users
+        WHEN (OLD.is_active = 1) != (NEW.is_active = 1)
+        BEGIN
+            UPDATE users_daily
+            SET active = active + (CASE WHEN NEW.is_active = 1 THEN 1 ELSE -1 END)
+            WHERE day = DATE(NEW.joined_at);
+        END
+    ''')
+
+    # Foydalanuvchi o'chirilishi
+    await db.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_users_daily_delete AFTER DELETE ON users
+        BEGIN
+            UPDATE users_daily
+            SET joined = joined - 1, active = active - (OLD.is_active = 1)
+            WHERE day = DATE(OLD.joined_at);
+        END
+    ''')
+
+    # Mavjud foydalanuvchilardan bir martalik to'ldirish
+    await db.execute('DELETE FROM users_daily')
+    await db.execute('''
+        INSERT INTO users_daily (day, joined, active)
+        SELECT DATE(joined_at), COUNT(*), SUM(is_active = 1)
+        FROM users
+        GROUP BY DATE(joined_at)
+    ''')
+
+
+async def _migration_5_payme_counters(db):
+    """Payme tranzaksiyalari hisoblagichlari (kurs, holat va kun bo'yicha)"""
+    # course_id bo'lmagan eski tranzaksiyalar 0 ga yoziladi
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS payme_counters (
+            course_id INTEGER NOT NULL,
+            state INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            amount INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (course_id, state, day)
+        ) WITHOUT ROWID
+    ''')
+
+    # Yangi tranzaksiya
+    await db.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_payme_counters_insert AFTER INSERT ON payme_transactions
+        BEGIN
+            INSERT INTO payme_counters (course_id, state, day, count, amount)
+            VALUES (IFNULL(NEW.course_id, 0), NEW.state, DATE(NEW.created_at), 1, NEW.amount)
+            ON CONFLICT(course_id, state, day) DO UPDATE SET
+                count = count + 1,
+                amount = amount + NEW.amount;
+        END
+    ''')
+
+    # Holat o'zgarishi: eski holatdan ayirib, yangisiga qo'shamiz
+    await db.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_payme_counters_state AFTER UPDATE OF state ON payme_transactions
+        WHEN OLD.state IS NOT NEW.state
+        BEGIN
+            UPDATE payme_counters
+            SET count = count - 1, amount = amount - OLD.amount
+            WHERE course_id = IFNULL(OLD.course_id, 0) AND state = OLD.state AND day = DATE(OLD.created_at);
+
+            INSERT INTO payme_counters (course_id, state, day, count, amount)
+            VALUES (IFNULL(NEW.course_id, 0), NEW.state, DATE(NEW.created_at), 1, NEW.amount)
+            ON CONFLICT(course_id, state, day) DO UPDATE SET
+                count = count + 1,
+                amount = amount + NEW.amount;
+        END
+    ''')
+
+    # Tranzaksiya o'chirilishi
+    await db.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_payme_counters_delete AFTER DELETE ON payme_transactions
+        BEGIN
+            UPDATE payme_counters
+            SET count = count - 1, amount = amount - OLD.amount
+            WHERE course_id = IFNULL(OLD.course_id, 0) AND state = OLD.state AND day = DATE(OLD.created_at);
+        END
+    ''')
+
+    # Mavjud tranzaksiyalardan bir martalik to'ldirish
+    await db.execute('DELETE FROM payme_counters')
+    await db.execute('''
+        INSERT INTO payme_counters (course_id, state, day, count, amount)
+        SELECT IFNULL(course_id, 0), state, DATE(created_at), COUNT(*), SUM(amount)
+        FROM payme_transactions
+        GROUP BY IFNULL(course_id, 0), state, DATE(created_at)
+    ''')
+
+
+async def _migration_6_payme_create_time(db):
+    """payme_transactions.create_time (epoch ms) - GetStatement oralig'i uchun"""
+    await _add_column(db, 'payme_transactions', 'create_time', 'INTEGER')
+
+    # created_at avval lokal vaqt sifatida talqin qilingan (timestamp_to_ms) - xuddi shunday to'ldiramiz
+    await db.execute('''
+        UPDATE payme_transactions
+        SET create_time = CAST(strftime('%s', created_at, 'utc') AS INTEGER) * 1000
+        WHERE create_time IS NULL
+    ''')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_payme_create_time ON payme_transactions(create_time)')
+
+
+async def _migration_7_payme_account_index(db):
+    """Pending tranzaksiya tekshiruvi uchun (user_id, course_id, state) indeksi"""
+    await db.execute('''
+        CREATE INDEX IF NOT EXISTS idx_payme_user_course_state
+        ON payme_transactions(user_id, course_id, state)
+    ''')
+
+
+async def _migration_8_notification_outbox(db):
+    """Yuborilishi kerak bo'lgan xabarlar (to'lov tranzaksiyasi bilan birga yoziladi)"""
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            chat_id INTEGER NOT NULL,
+            payload TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at INTEGER NOT NULL,
+            last_error TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            sent_at DATETIME
+        )
+    ''')
+    await db.execute('''
+        CREATE INDEX IF NOT EXISTS idx_outbox_pending
+        ON notification_outbox(next_attempt_at) WHERE status = 'pending'
+    ''')
+
+
+async def _migration_9_course_invite_links(db):
+    """Oldindan yaratilgan bir martalik invite linklar"""
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS course_invite_links (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            course_id INTEGER NOT NULL,
+            channel_id TEXT NOT NULL,
+            invite_link TEXT UNIQUE NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            claimed_by INTEGER,
+            claimed_at DATETIME
+        )
+    ''')
+    await db.execute('''
+        CREATE INDEX IF NOT EXISTS idx_invite_links_free
+        ON course_invite_links(course_id, id) WHERE claimed_by IS NULL
+    ''')
+
+
+async def _migration_10_course_enrollments(db):
+    """To'lov qilgan foydalanuvchilar (kurs bo'yicha), PerformTransaction da yoziladi"""
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS course_enrollments (
+            user_id INTEGER NOT NULL,
+            course_id INTEGER NOT NULL,
+            enrolled_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, course_id)
+        ) WITHOUT ROWID
+    ''')
+
+    # Mavjud muvaffaqiyatli to'lovlardan to'ldirish (course_id siz eski to'lovlar 0)
+    await db.execute('''
+        INSERT OR IGNORE INTO course_enrollments (user_id, course_id, enrolled_at)
+        SELECT user_id, IFNULL(course_id, 0), MIN(created_at)
+        FROM payme_transactions
+        WHERE state = 2
+        GROUP BY user_id, IFNULL(course_id, 0)
+    ''')
+
+
+async def _migration_11_broadcast_jobs(db):
+    """Broadcast joblari (davom ettiriladigan) va har bir qabul qiluvchi holati"""
+    await _add_column(db, 'broadcasts', 'content', 'TEXT')
+    # Eski yozuvlar yakunlangan deb hisoblanadi
+    await _add_column(db, 'broadcasts', 'status', "TEXT DEFAULT 'done'")
+    await _add_column(db, 'broadcasts', 'created_by', 'INTEGER')
+    await _add_column(db, 'broadcasts', 'last_chat_id', 'INTEGER DEFAULT 0')
+    await _add_column(db, 'broadcasts', 'started_at', 'DATETIME')
+    await _add_column(db, 'broadcasts', 'finished_at', 'DATETIME')
+    await _add_column(db, 'broadcasts', 'progress_chat_id', 'INTEGER')
+    await _add_column(db, 'broadcasts', 'progress_message_id', 'INTEGER')
+
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            job_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            error TEXT,
+            sent_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (job_id, chat_id)
+        ) WITHOUT ROWID
+    ''')
+
+
+async def _migration_12_broadcast_segments(db):
+    """Reklama segmentlari va ular uchun indekslar"""
+    await _add_column(db, 'broadcasts', 'segment', "TEXT DEFAULT 'all'")
+
+    # Segment so'rovlari uchun
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_users_joined_at ON users(joined_at)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_enrollments_course ON course_enrollments(course_id, user_id)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_payme_state_time ON payme_transactions(state, create_time)')
+
+
+async def _migration_13_broadcast_schedule(db):
+    """Rejalashtirilgan, yoyib yuboriladigan va takroriy reklamalar"""
+    await _add_column(db, 'broadcasts', 'scheduled_at', 'INTEGER')
+    await _add_column(db, 'broadcasts', 'spread_seconds', 'INTEGER DEFAULT 0')
+    await _add_column(db, 'broadcasts', 'repeat_interval', 'INTEGER DEFAULT 0')
+
+
+# (versiya, tavsif, funksiya) - faqat oxiriga qo'shiladi, mavjudlari o'zgartirilmaydi
+MIGRATIONS = [
+    (1, "Boshlang'ich sxema", _migration_1_initial),
+    (2, "payme_transactions.course_id", _migration_2_payme_course_id),
+    (3, "channel_members", _migration_3_channel_members),
+    (4, "users_daily", _migration_4_users_daily),
+    (5, "payme_counters", _migration_5_payme_counters),
+    (6, "payme_transactions.create_time", _migration_6_payme_create_time),
+    (7, "idx_payme_user_course_state", _migration_7_payme_account_index),
+    (8, "notification_outbox", _migration_8_notification_outbox),
+    (9, "course_invite_links", _migration_9_course_invite_links),
+    (10, "course_enrollments", _migration_10_course_enrollments),
+    (11, "broadcast_jobs", _migration_11_broadcast_jobs),
+    (12, "broadcast_segments", _migration_12_broadcast_segments),
+    (13, "broadcast_schedule", _migration_13_broadcast_schedule),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def get_schema_version(db) -> int:
+    async with db.execute('PRAGMA user_version') as cursor:
+        return (await cursor.fetchone())[0]
+
+
+async def run_migrations():
+    """Faqat qo'llanmagan migratsiyalarni bitta tranzaksiyada bajarish"""
+    # Tezkor yo'l: sxema yangi bo'lsa yozish lock ham olinmaydi
+    async with get_db() as db:
+        if await get_schema_version(db) >= SCHEMA_VERSION:
+            logger.info(f"Database schema is up to date (version {SCHEMA_VERSION})")
+            return
+
+    async with transaction() as db:
+        # Lock ostida qayta tekshirish (boshqa jarayon allaqachon yangilagan bo'lishi mumkin)
+        current = await get_schema_version(db)
+        if current >= SCHEMA_VERSION:
+            return
+
+        for version, description, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+
+            await migrate(db)
+            logger.info(f"Migration {version} applied: {description}")
+
+        # user_version ham shu tranzaksiya ichida yoziladi
+        await db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    logger.info(f"Database schema migrated: {current} -> {SCHEMA_VERSION}")
@@ -5,7 +5,16 @@ from handlers.start import (
 )
 from handlers.admin_panel import admin_command, admin_back_callback, cancel_action_callback
 from handlers.statistics import stats_callback
-from handlers.broadcast import broadcast_callback, receive_broadcast_content
+from handlers.broadcast import (
+    broadcast_callback,
+    broadcast_segment_callback,
+    receive_broadcast_content,
+    broadcast_when_callback,
+    receive_broadcast_time,
+    cancel_scheduled_broadcast_callback,
+    pause_broadcast_callback,
+    resume_broadcast_callback
+)
 from handlers.user_search import search_callback, receive_search_query
 from handlers.export import export_callback, export_csv_callback, export_excel_callback
 from handlers.admin_manage import (
@@ -26,4 +35,5 @@ from handlers.payment import (
     admin_payme_callback,
     payme_stats_callback,
     payme_recent_callback
-)
\ No newline at end of file
+)
+from handlers.channel_members import channel_member_callback
\ No newline at end of file
@@ -1,27 +1,77 @@
 import logging
-import asyncio
+import math
+import time
+from datetime import datetime, timedelta
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
+from config import TIMEZONE
 from middlewares.admin_check import admin_required_callback
-from keyboards.inline import get_back_keyboard, get_cancel_keyboard
-from services.user_service import get_all_users
-from config import BROADCAST_DELAY
+from keyboards.inline import (
+    get_back_keyboard,
+    get_cancel_keyboard,
+    get_broadcast_segments_keyboard,
+    get_broadcast_job_keyboard
+)
+from services.course_service import get_all_courses, get_course
+from services.segment_service import parse_segment, segment_title, count_segment
+from services.broadcast_service import (
+    extract_broadcast_content,
+    create_broadcast_job,
+    get_broadcast_job,
+    set_job_progress_message,
+    format_job_progress,
+    schedule_broadcast_job,
+    cancel_broadcast_job,
+    pause_broadcast_job,
+    resume_broadcast_job
+)
 
 logger = logging.getLogger(__name__)
 
 # States
 WAITING_BROADCAST_CONTENT = 1
 
+# Yoyib yuborishning eng uzun muddati (soat)
+MAX_SPREAD_HOURS = 7 * 24
+
 
 @admin_required_callback
 async def broadcast_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    context.user_data['state'] = 'waiting_broadcast'
+    courses = await get_all_courses()
 
     await query.message.edit_text(
         text="📢 <b>Reklama yuborish</b>\n\n"
+             "Reklama kimlarga yuborilsin?",
+        parse_mode='HTML',
+        reply_markup=get_broadcast_segments_keyboard(courses)
+    )
+
+
+@admin_required_callback
+async def broadcast_segment_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    segment = query.data[len('broadcast_segment_'):]
+
+    try:
+        kind, arg = parse_segment(segment)
+    except ValueError:
+        await query.answer("❌ Noma'lum segment")
+        return
+    await query.answer()
+
+    course = await get_course(arg) if kind == 'paid' else None
+    count = await count_segment(segment)
+
+    context.user_data['state'] = 'waiting_broadcast'
+    context.user_data['broadcast_segment'] = segment
+
+    await query.message.edit_text(
+        text=f"📢 <b>Reklama yuborish</b>\n\n"
+             f"🎯 Segment: {segment_title(segment, course['name'] if course else None)}\n"
+             f"👥 Qabul qiluvchilar: <b>{count}</b> ta\n\n"
              "Yubormoqchi bo'lgan xabaringizni yuboring.\n\n"
              "📝 Matn, 🖼 Rasm, 🎥 Video yoki ↗️ Forward qilishingiz mumkin.",
         parse_mode='HTML',
@@ -36,85 +86,172 @@ async def receive_broadcast_content(update: Update, context: ContextTypes.DEFAUL
         return
 
     message = update.message
-    users = await get_all_users()
-
-    total = len(users)
-    success = 0
-    failed = 0
+    content = extract_broadcast_content(message)
+    if content is None:
+        await message.reply_text("❌ Bu turdagi xabarni yuborib bo'lmaydi.")
+        return
 
-    logger.info(f"Broadcast started: {total} users")
+    segment = context.user_data.get('broadcast_segment', 'all')
+    job_id = await create_broadcast_job(content, update.effective_user.id, segment)
+    job = await get_broadcast_job(job_id)
 
     progress_message = await message.reply_text(
-        f"📤 Yuborilmoqda...\n\n"
-        f"✅ Yuborildi: 0\n"
-        f"❌ Yuborilmadi: 0\n"
-        f"📊 Jami: {total}"
+        format_job_progress(job),
+        parse_mode='HTML',
+        reply_markup=get_broadcast_job_keyboard(job_id, job['status'])
     )
+    await set_job_progress_message(job_id, progress_message.chat_id, progress_message.message_id)
 
-    for user in users:
-        try:
-            if message.text:
-                await context.bot.send_message(
-                    chat_id=user['chat_id'],
-                    text=message.text,
-                    parse_mode='HTML'
-                )
-            elif message.photo:
-                await context.bot.send_photo(
-                    chat_id=user['chat_id'],
-                    photo=message.photo[-1].file_id,
-                    caption=message.caption,
-                    parse_mode='HTML'
-                )
-            elif message.video:
-                await context.bot.send_video(
-                    chat_id=user['chat_id'],
-                    video=message.video.file_id,
-                    caption=message.caption,
-                    parse_mode='HTML'
-                )
-            elif message.document:
-                await context.bot.send_document(
-                    chat_id=user['chat_id'],
-                    document=message.document.file_id,
-                    caption=message.caption,
-                    parse_mode='HTML'
-                )
-            elif message.forward_date:
-                await message.copy(chat_id=user['chat_id'])
-
-            success += 1
-        except Exception as e:
-            failed += 1
-            logger.debug(f"Broadcast failed for user {user['chat_id']}: {e}")
-
-        # Har 20 ta userda progressni yangilash
-        if (success + failed) % 20 == 0:
-            try:
-                await progress_message.edit_text(
-                    f"📤 Yuborilmoqda...\n\n"
-                    f"✅ Yuborildi: {success}\n"
-                    f"❌ Yuborilmadi: {failed}\n"
-                    f"📊 Jami: {total}"
-                )
-            except:
-                pass
-
-        await asyncio.sleep(BROADCAST_DELAY)
-
-    # Yakuniy natija
-    await progress_message.edit_text(
-        f"✅ <b>Reklama yuborildi!</b>\n\n"
-        f"✅ Yuborildi: {success}\n"
-        f"❌ Yuborilmadi: {failed}\n"
-        f"📊 Jami: {total}",
-        parse_mode='HTML'
+    context.user_data.clear()
+    return ConversationHandler.END
+
+
+def _next_local_time(hour: int, minute: int = 0, days: int = 0) -> int:
+    """Mahalliy vaqt bo'yicha keyingi HH:MM (unix vaqt)"""
+    now = datetime.now(TIMEZONE)
+    moment = now.replace(hour=hour, minute=minute, second=0, microsecond=0) + timedelta(days=days)
+    if moment <= now:
+        moment += timedelta(days=1)
+    return int(moment.timestamp())
+
+
+def _parse_schedule_time(text: str) -> tuple:
+    """'2025-01-31 10:00 [soat]' yoki '10:00 [soat]' -> (unix vaqt, yoyish soniyalari)"""
+    parts = text.split()
+    spread_hours = 0.0
+    if parts and len(parts) in (2, 3) and ':' not in parts[-1]:
+        spread_hours = float(parts.pop().replace(',', '.'))
+
+    if len(parts) == 2:
+        moment = datetime.strptime(' '.join(parts), '%Y-%m-%d %H:%M').replace(tzinfo=TIMEZONE)
+        scheduled_at = int(moment.timestamp())
+    elif len(parts) == 1:
+        clock = datetime.strptime(parts[0], '%H:%M')
+        scheduled_at = _next_local_time(clock.hour, clock.minute)
+    else:
+        raise ValueError(text)
+
+    if not math.isfinite(spread_hours) or not 0 <= spread_hours <= MAX_SPREAD_HOURS:
+        raise ValueError(text)
+    return scheduled_at, int(spread_hours * 3600)
+
+
+async def _show_job(message, job):
+    await message.edit_text(
+        format_job_progress(job),
+        parse_mode='HTML',
+        reply_markup=get_broadcast_job_keyboard(job['id'], job['status'])
     )
 
-    logger.info(f"Broadcast finished: success={success}, failed={failed}")
 
+@admin_required_callback
+async def broadcast_when_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Qoralama uchun yuborish vaqtini tanlash"""
+    query = update.callback_query
+    _, _, job_id, option = query.data.split('_', 3)
+    job_id = int(job_id)
+
+    if option == 'custom':
+        await query.answer()
+        context.user_data['state'] = 'waiting_broadcast_time'
+        context.user_data['broadcast_job_id'] = job_id
+        await query.message.reply_text(
+            "✍️ Yuborish vaqtini kiriting:\n\n"
+            "<code>2025-01-31 10:00</code> yoki <code>10:00</code>\n"
+            "Yoyib yuborish uchun oxiriga soatlar sonini qo'shing: <code>10:00 2</code>",
+            parse_mode='HTML',
+            reply_markup=get_cancel_keyboard()
+        )
+        return
+
+    schedule = {
+        'now': {},
+        '1h': {'scheduled_at': int(time.time()) + 3600},
+        'tomorrow': {'scheduled_at': _next_local_time(9, days=1)},
+        'spread': {'spread_seconds': 2 * 3600},
+        'daily': {'scheduled_at': _next_local_time(9), 'repeat_interval': 24 * 3600},
+    }.get(option)
+    if schedule is None:
+        await query.answer()
+        return
+
+    job = await schedule_broadcast_job(context.bot, job_id, **schedule)
+    if job is None:
+        await query.answer("Reklama allaqachon yuborilgan yoki bekor qilingan")
+        return
+
+    await query.answer("✅ Qabul qilindi")
+    await _show_job(query.message, job)
+
+
+async def receive_broadcast_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if context.user_data.get('state') != 'waiting_broadcast_time':
+        return
+
+    job_id = context.user_data.get('broadcast_job_id')
+    try:
+        scheduled_at, spread_seconds = _parse_schedule_time(update.message.text.strip())
+    except ValueError:
+        await update.message.reply_text(
+            "❌ Noto'g'ri format. Masalan: <code>2025-01-31 10:00</code> yoki <code>10:00 2</code>",
+            parse_mode='HTML'
+        )
+        return
+
+    job = await schedule_broadcast_job(context.bot, job_id, scheduled_at, spread_seconds)
     context.user_data.clear()
-    return ConversationHandler.END
+
+    if job is None:
+        await update.message.reply_text("Reklama allaqachon yuborilgan yoki bekor qilingan")
+        return
+
+    await update.message.reply_text(
+        format_job_progress(job),
+        parse_mode='HTML',
+        reply_markup=get_broadcast_job_keyboard(job['id'], job['status'])
+    )
+
+
+@admin_required_callback
+async def cancel_scheduled_broadcast_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    job_id = int(query.data.split('_')[-1])
+
+    if not await cancel_broadcast_job(job_id):
+        await query.answer("Reklama allaqachon boshlangan")
+        return
+
+    await query.answer("❌ Bekor qilindi!")
+    await _show_job(query.message, await get_broadcast_job(job_id))
+
+
+@admin_required_callback
+async def pause_broadcast_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    job_id = int(query.data.split('_')[-1])
+
+    if await pause_broadcast_job(job_id):
+        await query.answer("⏸ Joriy partiyadan keyin to'xtatiladi")
+    else:
+        await query.answer("Reklama allaqachon to'xtatilgan yoki tugagan")
+
+
+@admin_required_callback
+async def resume_broadcast_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    job_id = int(query.data.split('_')[-1])
+
+    if not await resume_broadcast_job(context.bot, job_id):
+        await query.answer("Reklama to'xtatilmagan")
+        return
+
+    await query.answer("▶️ Davom ettirilmoqda")
+    job = await get_broadcast_job(job_id)
+    await query.message.edit_text(
+        format_job_progress(job),
+        parse_mode='HTML',
+        reply_markup=get_broadcast_job_keyboard(job_id, job['status'])
+    )
 
 
 async def cancel_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -0,0 +1,15 @@
+import logging
+from telegram import Update
+from telegram.ext import ContextTypes
+from services.member_service import chat_keys, set_member_status
+
+logger = logging.getLogger(__name__)
+
+
+async def channel_member_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Kanal a'zoligi o'zgarganda lokal nusxani yangilash (bot kanalda admin bo'lishi kerak)"""
+    member_update = update.chat_member
+    member = member_update.new_chat_member
+
+    await set_member_status(chat_keys(member_update.chat), member.user.id, member.status)
+    logger.debug(f"Channel member updated: {member.user.id} -> {member.status}")
\ No newline at end of file
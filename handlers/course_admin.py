@@ -20,6 +20,8 @@ from services.course_service import (
     delete_course,
     format_price
 )
+from services.payme_service import get_course_stats
+from services.invite_service import get_pool_size
 
 logger = logging.getLogger(__name__)
 
@@ -224,6 +226,10 @@ async def course_detail_callback(update: Update, context: ContextTypes.DEFAULT_T
     status = "✅ Aktiv" if course['is_active'] else "⭕ Noaktiv"
     price_text = await format_price(course['price'])
 
+    stats = await get_course_stats(course_id)
+    total_amount_text = await format_price(stats['total_amount'])
+    pool_size = await get_pool_size(course_id)
+
     # Welcome matnni qisqartirish
     welcome_preview = course['welcome_text'] or '-'
     if len(welcome_preview) > 100:
@@ -235,7 +241,10 @@ async def course_detail_callback(update: Update, context: ContextTypes.DEFAULT_T
         f"💰 Narx: {price_text} so'm\n"
         f"📢 Kanal ID: {course['channel_id']}\n"
         f"🔗 Kanal URL: {course['channel_url'] or '-'}\n"
-        f"📅 Yaratilgan: {course['created_at']}\n\n"
+        f"📅 Yaratilgan: {course['created_at']}\n"
+        f"💳 To'lovlar: {stats['success']} / {stats['total']} ta\n"
+        f"💰 Tushum: {total_amount_text} so'm\n"
+        f"🎟 Tayyor linklar: {pool_size} ta\n\n"
         f"📝 Welcome matn:\n"
         f"{welcome_preview}"
     )
@@ -18,22 +18,18 @@ async def export_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
-@admin_required_callback
-async def export_csv_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer("📄 CSV tayyorlanmoqda...")
-
+async def _send_export(context: ContextTypes.DEFAULT_TYPE, query, export, filename: str, caption: str):
+    """Faylni tayyorlab yuborish (fonda, boshqa update larni to'xtatmaydi)"""
     try:
-        filepath = await export_to_csv()
-
-        await query.message.delete()
-        await context.bot.send_document(
-            chat_id=query.from_user.id,
-            document=open(filepath, 'rb'),
-            filename="users.csv",
-            caption="📄 Foydalanuvchilar ro'yxati (CSV)",
-            reply_markup=get_back_keyboard()
-        )
+        with await export() as document:
+            await query.message.delete()
+            await context.bot.send_document(
+                chat_id=query.from_user.id,
+                document=document,
+                filename=filename,
+                caption=caption,
+                reply_markup=get_back_keyboard()
+            )
     except Exception as e:
         await query.message.edit_text(
             text=f"❌ Xatolik yuz berdi: {str(e)}",
@@ -41,24 +37,30 @@ async def export_csv_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
 
 
+@admin_required_callback
+async def export_csv_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    compress = query.data == 'export_csv_gz'
+    await query.answer("📄 CSV tayyorlanmoqda...")
+
+    context.application.create_task(
+        _send_export(
+            context, query, lambda: export_to_csv(compress),
+            "users.csv.gz" if compress else "users.csv",
+            "📄 Foydalanuvchilar ro'yxati (CSV)"
+        ),
+        update=update,
+        name="export_csv"
+    )
+
+
 @admin_required_callback
 async def export_excel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer("📊 Excel tayyorlanmoqda...")
 
-    try:
-        filepath = await export_to_excel()
-
-        await query.message.delete()
-        await context.bot.send_document(
-            chat_id=query.from_user.id,
-            document=open(filepath, 'rb'),
-            filename="users.xlsx",
-            caption="📊 Foydalanuvchilar ro'yxati (Excel)",
-            reply_markup=get_back_keyboard()
-        )
-    except Exception as e:
-        await query.message.edit_text(
-            text=f"❌ Xatolik yuz berdi: {str(e)}",
-            reply_markup=get_back_keyboard()
-        )
\ No newline at end of file
+    context.application.create_task(
+        _send_export(context, query, export_to_excel, "users.xlsx", "📊 Foydalanuvchilar ro'yxati (Excel)"),
+        update=update,
+        name="export_excel"
+    )
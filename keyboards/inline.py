@@ -100,7 +100,10 @@ def get_admin_manage_keyboard() -> InlineKeyboardMarkup:
 
 def get_export_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton("📄 CSV", callback_data="export_csv")],
+        [
+            InlineKeyboardButton("📄 CSV", callback_data="export_csv"),
+            InlineKeyboardButton("🗜 CSV (gzip)", callback_data="export_csv_gz")
+        ],
         [InlineKeyboardButton("📊 Excel", callback_data="export_excel")],
         [InlineKeyboardButton("🔙 Orqaga", callback_data="admin_back")]
     ])
@@ -112,6 +115,57 @@ def get_cancel_keyboard() -> InlineKeyboardMarkup:
     ])
 
 
+def get_broadcast_segments_keyboard(courses: list) -> InlineKeyboardMarkup:
+    """Reklama kimlarga yuborilishini tanlash"""
+    keyboard = [[InlineKeyboardButton("👥 Barcha foydalanuvchilar", callback_data="broadcast_segment_all")]]
+
+    for course in courses:
+        keyboard.append([
+            InlineKeyboardButton(f"💳 To'lov qilganlar: {course['name']}",
+                                 callback_data=f"broadcast_segment_paid:{course['id']}")
+        ])
+
+    keyboard.extend([
+        [InlineKeyboardButton("🆓 To'lov qilmaganlar", callback_data="broadcast_segment_unpaid")],
+        [
+            InlineKeyboardButton("🆕 Oxirgi 7 kun", callback_data="broadcast_segment_recent:7"),
+            InlineKeyboardButton("🆕 Oxirgi 30 kun", callback_data="broadcast_segment_recent:30")
+        ],
+        [InlineKeyboardButton("⏳ To'lovi tugallanmaganlar (1 soatdan ko'p)", callback_data="broadcast_segment_pending")],
+        [InlineKeyboardButton("❌ Bekor qilish", callback_data="cancel_action")]
+    ])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def get_broadcast_job_keyboard(job_id: int, status: str) -> InlineKeyboardMarkup | None:
+    """Broadcast xabari: yuborish vaqti, to'xtatish / davom ettirish, bekor qilish"""
+    if status == 'draft':
+        return InlineKeyboardMarkup([
+            [InlineKeyboardButton("🚀 Hozir yuborish", callback_data=f"broadcast_when_{job_id}_now")],
+            [
+                InlineKeyboardButton("⏰ 1 soatdan keyin", callback_data=f"broadcast_when_{job_id}_1h"),
+                InlineKeyboardButton("🌅 Ertaga 09:00", callback_data=f"broadcast_when_{job_id}_tomorrow")
+            ],
+            [InlineKeyboardButton("🐢 2 soat davomida yoyib", callback_data=f"broadcast_when_{job_id}_spread")],
+            [InlineKeyboardButton("🔁 Har kuni 09:00 da", callback_data=f"broadcast_when_{job_id}_daily")],
+            [InlineKeyboardButton("✍️ Vaqtni kiritish", callback_data=f"broadcast_when_{job_id}_custom")],
+            [InlineKeyboardButton("❌ Bekor qilish", callback_data=f"broadcast_cancel_{job_id}")]
+        ])
+    if status == 'scheduled':
+        return InlineKeyboardMarkup([
+            [InlineKeyboardButton("❌ Bekor qilish", callback_data=f"broadcast_cancel_{job_id}")]
+        ])
+    if status == 'running':
+        return InlineKeyboardMarkup([
+            [InlineKeyboardButton("⏸ To'xtatish", callback_data=f"broadcast_pause_{job_id}")]
+        ])
+    if status == 'paused':
+        return InlineKeyboardMarkup([
+            [InlineKeyboardButton("▶️ Davom ettirish", callback_data=f"broadcast_resume_{job_id}")]
+        ])
+    return None
+
+
 def get_payme_stats_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [InlineKeyboardButton("📊 Payme statistikasi", callback_data="payme_stats")],
@@ -2,16 +2,27 @@ import logging
 import uvicorn
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from telegram import Update
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
+    ChatMemberHandler,
     MessageHandler,
     filters
 )
 
-from config import BOT_TOKEN, BOT_NAME, LOG_LEVEL
-from database.models import create_tables, migrate_add_course_id
+from config import BOT_TOKEN, BOT_NAME, LOG_LEVEL, UPDATE_CONCURRENCY, TELEGRAM_RATE, TELEGRAM_CHAT_RATE
+from database.connection import init_db, close_db
+from database.models import run_migrations
+from services.user_service import start_user_buffer, stop_user_buffer
+from services.admin_service import load_admins
+from services.settings_service import load_settings
+from services.notification_service import start_notification_worker, stop_notification_worker
+from services.invite_service import start_invite_pool, stop_invite_pool
+from services.broadcast_service import resume_broadcast_jobs, stop_broadcast_jobs
+from utils.update_processor import PerChatUpdateProcessor
+from utils.rate_limiter import PriorityRateLimiter
 
 # Logging sozlash
 logging.basicConfig(
@@ -28,7 +39,16 @@ from handlers.start import (
 )
 from handlers.admin_panel import admin_command, admin_back_callback, cancel_action_callback
 from handlers.statistics import stats_callback
-from handlers.broadcast import broadcast_callback, receive_broadcast_content
+from handlers.broadcast import (
+    broadcast_callback,
+    broadcast_segment_callback,
+    receive_broadcast_content,
+    broadcast_when_callback,
+    receive_broadcast_time,
+    cancel_scheduled_broadcast_callback,
+    pause_broadcast_callback,
+    resume_broadcast_callback
+)
 from handlers.user_search import search_callback, receive_search_query
 from handlers.export import export_callback, export_csv_callback, export_excel_callback
 from handlers.admin_manage import (
@@ -50,6 +70,7 @@ from handlers.payment import (
     payme_stats_callback,
     payme_recent_callback
 )
+from handlers.channel_members import channel_member_callback
 from handlers.course_admin import (
     courses_menu_callback,
     add_course_callback,
@@ -87,6 +108,8 @@ async def handle_text_messages(update, context):
     # Broadcast
     if state == 'waiting_broadcast':
         await receive_broadcast_content(update, context)
+    elif state == 'waiting_broadcast_time':
+        await receive_broadcast_time(update, context)
 
     # Search
     elif state == 'waiting_search':
@@ -129,7 +152,15 @@ async def handle_text_messages(update, context):
 
 def setup_bot() -> Application:
     """Bot handlerlarini sozlash"""
-    app = Application.builder().token(BOT_TOKEN).build()
+    # Reklama yoki export paytida ham oddiy foydalanuvchilar kutib qolmaydi
+    app = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(PerChatUpdateProcessor(UPDATE_CONCURRENCY))
+        # Barcha chiquvchi xabarlar bitta navbat orqali: to'lov > javoblar > reklama
+        .rate_limiter(PriorityRateLimiter(TELEGRAM_RATE, TELEGRAM_CHAT_RATE))
+        .build()
+    )
 
     # Command handlers
     app.add_handler(CommandHandler("start", start_command))
@@ -144,7 +175,7 @@ def setup_bot() -> Application:
     app.add_handler(CallbackQueryHandler(cancel_action_callback, pattern="^cancel_action$"))
     app.add_handler(CallbackQueryHandler(stats_callback, pattern="^admin_stats$"))
     app.add_handler(CallbackQueryHandler(export_callback, pattern="^admin_export$"))
-    app.add_handler(CallbackQueryHandler(export_csv_callback, pattern="^export_csv$"))
+    app.add_handler(CallbackQueryHandler(export_csv_callback, pattern="^export_csv(_gz)?$"))
     app.add_handler(CallbackQueryHandler(export_excel_callback, pattern="^export_excel$"))
     app.add_handler(CallbackQueryHandler(admin_manage_callback, pattern="^admin_manage$"))
     app.add_handler(CallbackQueryHandler(list_admins_callback, pattern="^list_admins$"))
@@ -170,6 +201,11 @@ def setup_bot() -> Application:
 
     # Broadcast
     app.add_handler(CallbackQueryHandler(broadcast_callback, pattern="^admin_broadcast$"))
+    app.add_handler(CallbackQueryHandler(broadcast_segment_callback, pattern="^broadcast_segment_"))
+    app.add_handler(CallbackQueryHandler(broadcast_when_callback, pattern="^broadcast_when_"))
+    app.add_handler(CallbackQueryHandler(cancel_scheduled_broadcast_callback, pattern="^broadcast_cancel_"))
+    app.add_handler(CallbackQueryHandler(pause_broadcast_callback, pattern="^broadcast_pause_"))
+    app.add_handler(CallbackQueryHandler(resume_broadcast_callback, pattern="^broadcast_resume_"))
 
     # Search
     app.add_handler(CallbackQueryHandler(search_callback, pattern="^admin_search$"))
@@ -181,6 +217,9 @@ def setup_bot() -> Application:
     # Channel change
     app.add_handler(CallbackQueryHandler(change_channel_callback, pattern="^change_channel$"))
 
+    # Kanal a'zoligi (majburiy obuna uchun lokal nusxa)
+    app.add_handler(ChatMemberHandler(channel_member_callback, ChatMemberHandler.CHAT_MEMBER))
+
     # Message handlers
     app.add_handler(MessageHandler(
         filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE,
@@ -195,8 +234,18 @@ async def lifespan(app: FastAPI):
     """FastAPI startup va shutdown"""
     global bot_app
 
-    # Database yaratish (migration ichida)
-    await create_tables()
+    # Database ulanishlar pulini ochish
+    await init_db()
+
+    # Sxema migratsiyalari (sxema yangi bo'lsa darhol qaytadi)
+    await run_migrations()
+
+    # /start foydalanuvchilarini guruhlab yozish
+    start_user_buffer()
+
+    # Adminlar va sozlamalarni xotiraga yuklash
+    await load_admins()
+    await load_settings()
 
     logger.info("✅ Database tayyor!")
 
@@ -204,15 +253,30 @@ async def lifespan(app: FastAPI):
     bot_app = setup_bot()
     await bot_app.initialize()
     await bot_app.start()
-    await bot_app.updater.start_polling(drop_pending_updates=True)
+    # chat_member update lari faqat aniq so'ralganda keladi
+    await bot_app.updater.start_polling(drop_pending_updates=True, allowed_updates=Update.ALL_TYPES)
+
+    # To'lov xabarlari outbox dan fonda yuboriladi
+    start_notification_worker(bot_app.bot)
+
+    # Bir martalik invite linklar puli fonda to'ldiriladi
+    start_invite_pool(bot_app.bot)
+
+    # Restart oldidan tugallanmagan reklamalar kursordan davom etadi, rejalashtirilganlar JobQueue ga qaytadi
+    await resume_broadcast_jobs(bot_app)
     logger.info(f"✅ {BOT_NAME} ishga tushdi!")
 
     yield
 
     # Shutdown
+    await stop_notification_worker()
+    await stop_invite_pool()
+    await stop_broadcast_jobs()
     await bot_app.updater.stop()
     await bot_app.stop()
     await bot_app.shutdown()
+    await stop_user_buffer()
+    await close_db()
     logger.info(f"🛑 {BOT_NAME} to'xtadi!")
 
 
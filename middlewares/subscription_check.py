@@ -2,21 +2,33 @@ from telegram import Update, Bot
 from telegram.ext import ContextTypes
 from telegram.error import TelegramError
 from services.settings_service import is_force_subscribe_enabled, get_channel_id
+from services.member_service import SUBSCRIBED_STATUSES, get_member_status, set_member_status
 from keyboards.inline import get_check_subscription_keyboard
 from config import CHANNEL_ID
 
 
 async def check_subscription(bot: Bot, user_id: int) -> bool:
-    try:
-        channel = await get_channel_id() or CHANNEL_ID
-        if not channel:
-            return True
+    channel = await get_channel_id() or CHANNEL_ID
+    if not channel:
+        return True
+
+    # Lokal nusxa (chat_member update lar bilan yangilanadi); obuna bo'lmaganlar har safar
+    # qayta tekshiriladi - bot o'chiq paytda qayta qo'shilganlar update yubormaydi
+    status = await get_member_status(channel, user_id)
+    if status in SUBSCRIBED_STATUSES:
+        return True
 
+    try:
         member = await bot.get_chat_member(chat_id=channel, user_id=user_id)
-        return member.status in ['member', 'administrator', 'creator']
     except TelegramError:
         return True
 
+    # Noma'lum foydalanuvchining faqat obuna holati saqlanadi, mavjud yozuv esa yangilanadi
+    if member.status in SUBSCRIBED_STATUSES or status is not None:
+        await set_member_status([channel], user_id, member.status)
+
+    return member.status in SUBSCRIBED_STATUSES
+
 
 async def subscription_required(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     if not await is_force_subscribe_enabled():
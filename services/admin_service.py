@@ -1,50 +1,74 @@
 import aiosqlite
-from config import DB_PATH, OWNER_ID
+from config import OWNER_ID
+from database.connection import get_db, transaction
+
+# Adminlar chat_id to'plami (xotirada). None - hali yuklanmagan
+_admin_ids = None
+
+
+async def load_admins() -> set:
+    """Adminlarni bazadan qayta yuklash (jadval tashqaridan o'zgarganda ham chaqiriladi)"""
+    global _admin_ids
+
+    async with get_db() as db:
+        async with db.execute('SELECT chat_id FROM admins') as cursor:
+            _admin_ids = {row[0] for row in await cursor.fetchall()}
+    return _admin_ids
 
 
 async def is_admin(chat_id: int) -> bool:
     if chat_id == OWNER_ID:
         return True
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute('SELECT * FROM admins WHERE chat_id = ?', (chat_id,)) as cursor:
-            return await cursor.fetchone() is not None
+    if _admin_ids is None:
+        await load_admins()
+
+    return chat_id in _admin_ids
 
 
 async def add_admin(chat_id: int, added_by: int) -> bool:
     if chat_id == OWNER_ID:
         return False
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction() as db:
         try:
             await db.execute('''
                 INSERT INTO admins (chat_id, added_by) VALUES (?, ?)
             ''', (chat_id, added_by))
-            await db.commit()
-            return True
         except aiosqlite.IntegrityError:
             return False
 
+    if _admin_ids is not None:
+        _admin_ids.add(chat_id)
+    return True
+
 
 async def remove_admin(chat_id: int) -> bool:
     if chat_id == OWNER_ID:
         return False
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction() as db:
         cursor = await db.execute('DELETE FROM admins WHERE chat_id = ?', (chat_id,))
-        await db.commit()
-        return cursor.rowcount > 0
+
+    if _admin_ids is not None:
+        _admin_ids.discard(chat_id)
+    return cursor.rowcount > 0
 
 
 async def get_all_admins():
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    global _admin_ids
+
+    async with get_db() as db:
         async with db.execute('SELECT * FROM admins') as cursor:
-            return await cursor.fetchall()
+            admins = await cursor.fetchall()
+
+    # Ro'yxat baribir o'qildi - xotiradagi to'plamni ham yangilaymiz
+    _admin_ids = {admin['chat_id'] for admin in admins}
+    return admins
 
 
 async def get_admins_count() -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         async with db.execute('SELECT COUNT(*) FROM admins') as cursor:
             result = await cursor.fetchone()
             return result[0] + 1  # +1 for OWNER
\ No newline at end of file
@@ -0,0 +1,555 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from telegram import Bot, Message
+from telegram.error import RetryAfter, TimedOut, NetworkError, TelegramError, Forbidden, BadRequest
+from telegram.ext import Application, ContextTypes
+from config import BROADCAST_RATE, BROADCAST_WORKERS, BROADCAST_BATCH_SIZE, TIMEZONE
+from database.connection import get_db, transaction
+from keyboards.inline import get_broadcast_job_keyboard
+from services.user_service import deactivate_users
+from services.segment_service import segment_condition
+from utils.rate_limiter import PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
+
+# Tarmoq xatosida bitta foydalanuvchiga qayta urinishlar soni
+SEND_ATTEMPTS = 3
+# Progress xabarini yangilash oralig'i (soniya)
+PROGRESS_INTERVAL = 3
+# Yoyib yuborishda eng past tezlik (xabar/s)
+MIN_SPREAD_RATE = 0.01
+# BadRequest xatolari ichida foydalanuvchi yo'qligini bildiradiganlari
+UNREACHABLE_REASONS = ('chat not found', 'user not found', 'peer_id_invalid', 'user is deactivated')
+
+
+class TokenBucket:
+    """Token bucket: sekundiga `rate` ta yuborish, `capacity` gacha portlash"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        # Sekin tezlikda ham kamida bitta token yig'ilishi kerak
+        self.capacity = max(1, capacity or rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """RetryAfter: barcha yuboruvchilarni to'xtatib turish"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    self._updated = time.monotonic()
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def extract_broadcast_content(message: Message) -> dict | None:
+    """Admin yuborgan xabardan tarqatiladigan kontent"""
+    if message.text:
+        return {'type': 'text', 'text': message.text}
+    if message.photo:
+        return {'type': 'photo', 'file_id': message.photo[-1].file_id, 'caption': message.caption}
+    if message.video:
+        return {'type': 'video', 'file_id': message.video.file_id, 'caption': message.caption}
+    if message.document:
+        return {'type': 'document', 'file_id': message.document.file_id, 'caption': message.caption}
+    if message.forward_origin:
+        return {'type': 'copy', 'from_chat_id': message.chat_id, 'message_id': message.message_id}
+    return None
+
+
+async def send_content(bot: Bot, chat_id: int, content: dict):
+    """Kontentni bitta foydalanuvchiga yuborish"""
+    kind = content['type']
+
+    # Reklama eng past navbatda - to'lov xabarlari va javoblarni kutdirmaydi
+    if kind == 'text':
+        await bot.send_message(chat_id=chat_id, text=content['text'], parse_mode='HTML',
+                               rate_limit_args=PRIORITY_BULK)
+    elif kind == 'photo':
+        await bot.send_photo(chat_id=chat_id, photo=content['file_id'],
+                             caption=content.get('caption'), parse_mode='HTML',
+                             rate_limit_args=PRIORITY_BULK)
+    elif kind == 'video':
+        await bot.send_video(chat_id=chat_id, video=content['file_id'],
+                             caption=content.get('caption'), parse_mode='HTML',
+                             rate_limit_args=PRIORITY_BULK)
+    elif kind == 'document':
+        await bot.send_document(chat_id=chat_id, document=content['file_id'],
+                                caption=content.get('caption'), parse_mode='HTML',
+                                rate_limit_args=PRIORITY_BULK)
+    elif kind == 'copy':
+        await bot.copy_message(chat_id=chat_id, from_chat_id=content['from_chat_id'],
+                               message_id=content['message_id'], rate_limit_args=PRIORITY_BULK)
+    else:
+        raise ValueError(f"Unknown broadcast content: {kind}")
+
+
+def is_unreachable(error: TelegramError) -> bool:
+    """Foydalanuvchiga umuman yetib bo'lmaydi (bloklagan, o'chirilgan) - qayta urinish foydasiz"""
+    if isinstance(error, Forbidden):
+        return True
+    if isinstance(error, BadRequest):
+        message = error.message.lower()
+        return any(reason in message for reason in UNREACHABLE_REASONS)
+    return False
+
+
+async def _send_one(bot: Bot, bucket: TokenBucket, chat_id: int, content: dict) -> tuple:
+    """Yuborish natijasi: (status, xato). status - 'sent', 'failed' yoki 'blocked'"""
+    attempts = 0
+    while True:
+        await bucket.acquire()
+        try:
+            await send_content(bot, chat_id, content)
+            return 'sent', None
+        except RetryAfter as e:
+            # Foydalanuvchi emas, limit aybdor - butun bucket to'xtaydi va qayta urinamiz
+            logger.warning(f"Broadcast flood limit, pausing {e.retry_after}s")
+            bucket.pause(e.retry_after)
+        except BadRequest as e:
+            # BadRequest ham NetworkError dan meros oladi, lekin qayta urinishdan foyda yo'q
+            logger.debug(f"Broadcast failed for user {chat_id}: {e}")
+            return ('blocked' if is_unreachable(e) else 'failed'), str(e)
+        except (TimedOut, NetworkError) as e:
+            attempts += 1
+            if attempts >= SEND_ATTEMPTS:
+                logger.debug(f"Broadcast failed for user {chat_id}: {e}")
+                return 'failed', str(e)
+        except TelegramError as e:
+            logger.debug(f"Broadcast failed for user {chat_id}: {e}")
+            return ('blocked' if is_unreachable(e) else 'failed'), str(e)
+
+
+async def send_batch(bot: Bot, bucket: TokenBucket, chat_ids: list, content: dict,
+                     results: list, workers: int = BROADCAST_WORKERS):
+    """Partiyani parallel yuboruvchilar orqali jo'natish; natijalar results ga (chat_id, status, error)"""
+    queue = asyncio.Queue()
+    for chat_id in chat_ids:
+        queue.put_nowait(chat_id)
+
+    async def worker():
+        while not queue.empty():
+            chat_id = queue.get_nowait()
+            status, error = await _send_one(bot, bucket, chat_id, content)
+            results.append((chat_id, status, error))
+
+    tasks = [asyncio.create_task(worker()) for _ in range(min(workers, len(chat_ids)))]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+# ============ SAQLANADIGAN BROADCAST JOBLAR ============
+
+# job_id -> fonda ishlayotgan vazifa
+_job_tasks = {}
+# Rejalashtirilgan joblar uchun PTB JobQueue (startupda o'rnatiladi)
+_job_queue = None
+
+
+def _format_time(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, TIMEZONE).strftime('%Y-%m-%d %H:%M')
+
+
+def format_job_progress(job, rate: float = None) -> str:
+    status = job['status']
+    if status == 'done':
+        title = "✅ <b>Reklama yuborildi!</b>"
+    elif status == 'paused':
+        title = "⏸ <b>Reklama to'xtatildi</b>"
+    elif status == 'draft':
+        title = "📢 <b>Reklama qachon yuborilsin?</b>"
+    elif status == 'scheduled':
+        title = f"⏰ <b>Reklama rejalashtirildi: {_format_time(job['scheduled_at'])}</b>"
+    elif status == 'cancelled':
+        title = "❌ <b>Reklama bekor qilindi</b>"
+    else:
+        title = "📤 <b>Yuborilmoqda...</b>"
+
+    if status in ('draft', 'scheduled', 'cancelled'):
+        text = f"{title}\n\n👥 Qabul qiluvchilar: {job['total_users']} ta"
+    else:
+        text = (
+            f"{title}\n\n"
+            f"✅ Yuborildi: {job['success']}\n"
+            f"❌ Yuborilmadi: {job['failed']}\n"
+            f"📊 Jami: {job['total_users']}"
+        )
+
+    if job['spread_seconds']:
+        text += f"\n🐢 {job['spread_seconds'] // 60} daqiqa davomida yoyib yuboriladi"
+    if job['repeat_interval'] and status != 'cancelled':
+        text += f"\n🔁 Har {job['repeat_interval'] // 3600} soatda takrorlanadi"
+    if rate is not None:
+        text += f"\n⚡ Tezlik: {rate:.1f} xabar/s"
+    return text
+
+
+async def create_broadcast_job(content: dict, created_by: int, segment: str = 'all') -> int:
+    """Yangi broadcast job (qoralama) yaratish; yuborish vaqti keyin tanlanadi"""
+    condition, params = segment_condition(segment)
+    async with transaction() as db:
+        async with db.execute(f'''
+            INSERT INTO broadcasts (message_type, content, segment, status, created_by, total_users, success, failed)
+            SELECT :type, :content, :segment, 'draft', :created_by, COUNT(*), 0, 0
+            FROM users u WHERE u.is_active = 1 AND {condition}
+            RETURNING id
+        ''', {'type': content['type'], 'content': json.dumps(content), 'segment': segment,
+              'created_by': created_by, **params}) as cursor:
+            row = await cursor.fetchone()
+    logger.info(f"Broadcast job created: {row['id']}")
+    return row['id']
+
+
+async def set_job_progress_message(job_id: int, chat_id: int, message_id: int):
+    """Progress ko'rsatiladigan xabar (restartdan keyin ham yangilanadi)"""
+    async with transaction() as db:
+        await db.execute('''
+            UPDATE broadcasts SET progress_chat_id = ?, progress_message_id = ?
+            WHERE id = ?
+        ''', (chat_id, message_id, job_id))
+
+
+async def get_broadcast_job(job_id: int):
+    async with get_db() as db:
+        async with db.execute('SELECT * FROM broadcasts WHERE id = ?', (job_id,)) as cursor:
+            return await cursor.fetchone()
+
+
+async def _next_recipients(job_id: int, segment: str, after: int, limit: int) -> list:
+    """Keyingi partiya: kursordan keyingi, hali yozilmagan, segmentdagi aktiv foydalanuvchilar"""
+    condition, params = segment_condition(segment)
+    async with get_db() as db:
+        async with db.execute(f'''
+            SELECT u.chat_id FROM users u
+            WHERE u.is_active = 1 AND u.chat_id > :after
+              AND {condition}
+              AND NOT EXISTS (
+                  SELECT 1 FROM broadcast_deliveries d
+                  WHERE d.job_id = :job_id AND d.chat_id = u.chat_id
+              )
+            ORDER BY u.chat_id
+            LIMIT :limit
+        ''', {'after': after, 'job_id': job_id, 'limit': limit, **params}) as cursor:
+            return [row['chat_id'] for row in await cursor.fetchall()]
+
+
+async def _checkpoint(job_id: int, results: list, cursor_id: int = None, finished: bool = False):
+    """Natijalar va kursorni bitta tranzaksiyada yozish; yangilangan job qaytadi"""
+    success = sum(1 for _, status, _ in results if status == 'sent')
+
+    async with transaction() as db:
+        await db.executemany('''
+            INSERT OR IGNORE INTO broadcast_deliveries (job_id, chat_id, status, error)
+            VALUES (?, ?, ?, ?)
+        ''', [(job_id, chat_id, status, error) for chat_id, status, error in results])
+
+        # Yetib bo'lmaydigan foydalanuvchilar keyingi reklamalarga kirmaydi
+        await deactivate_users([chat_id for chat_id, status, _ in results if status == 'blocked'])
+
+        async with db.execute('''
+            UPDATE broadcasts
+            SET success = success + ?,
+                failed = failed + ?,
+                last_chat_id = IFNULL(?, last_chat_id),
+                status = CASE WHEN ? THEN 'done' ELSE status END,
+                finished_at = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE finished_at END
+            WHERE id = ?
+            RETURNING *
+        ''', (success, len(results) - success, cursor_id, finished, finished, job_id)) as cursor:
+            return await cursor.fetchone()
+
+
+async def _update_progress(bot: Bot, job, rate: float = None, text: str = None, reply_markup=None):
+    if not job['progress_chat_id'] or not job['progress_message_id']:
+        return
+    try:
+        await bot.edit_message_text(
+            chat_id=job['progress_chat_id'],
+            message_id=job['progress_message_id'],
+            text=text or format_job_progress(job, rate),
+            parse_mode='HTML',
+            reply_markup=reply_markup or get_broadcast_job_keyboard(job['id'], job['status'])
+        )
+    except TelegramError as e:
+        logger.debug(f"Broadcast progress error: {e}")
+
+
+def _job_rate(job) -> float:
+    """Yoyib yuborishda: qolgan qabul qiluvchilar / qolgan vaqt"""
+    if not job['spread_seconds']:
+        return BROADCAST_RATE
+
+    remaining = max(job['total_users'] - job['success'] - job['failed'], 1)
+    time_left = job['scheduled_at'] + job['spread_seconds'] - time.time()
+    if time_left <= 0:
+        return BROADCAST_RATE
+    return min(BROADCAST_RATE, max(remaining / time_left, MIN_SPREAD_RATE))
+
+
+async def _run_job(bot: Bot, job_id: int):
+    # Joriy partiyaning hali yozilmagan natijalari - xatoda ham saqlanadi
+    pending = []
+    try:
+        await _run_job_batches(bot, job_id, pending)
+    except Exception:
+        logger.exception(f"Broadcast job {job_id} failed")
+        _job_tasks.pop(job_id, None)
+        try:
+            # Yuborilganlarni yozamiz - davom ettirilganda ularga qayta yuborilmaydi
+            if pending:
+                await _checkpoint(job_id, pending)
+            await pause_broadcast_job(job_id)
+            job = await get_broadcast_job(job_id)
+        except Exception:
+            logger.exception(f"Broadcast job {job_id}: failed to save progress")
+            return
+        if job is not None:
+            await _update_progress(bot, job)
+
+
+async def _run_job_batches(bot: Bot, job_id: int, pending: list):
+    job = await get_broadcast_job(job_id)
+    if job is None:
+        raise LookupError(f"Broadcast job {job_id} not found")
+    content = json.loads(job['content'])
+
+    # Takroriy reklamaning yangi nusxasi - progress uchun yangi xabar
+    if job['progress_chat_id'] and not job['progress_message_id']:
+        try:
+            message = await bot.send_message(job['progress_chat_id'], format_job_progress(job), parse_mode='HTML')
+            await set_job_progress_message(job_id, message.chat_id, message.message_id)
+            job = await get_broadcast_job(job_id)
+        except TelegramError as e:
+            logger.debug(f"Broadcast progress error: {e}")
+
+    rate = _job_rate(job)
+    bucket = TokenBucket(rate)
+    # Sekin yuborishda ham pauza tez ishlashi uchun partiya ~30 soniyalik
+    batch_size = max(1, min(BROADCAST_BATCH_SIZE, int(rate * 30)))
+    started = time.monotonic()
+    processed = 0
+    last_report = started
+    logger.info(f"Broadcast job {job_id} running from cursor {job['last_chat_id']} at {rate:.2f} msg/s")
+
+    while True:
+        chat_ids = await _next_recipients(job_id, job['segment'], job['last_chat_id'], batch_size)
+        if not chat_ids:
+            break
+
+        try:
+            await send_batch(bot, bucket, chat_ids, content, pending)
+        except asyncio.CancelledError:
+            # Shutdown: yuborilganlarni yozib qo'yamiz - ular qayta yuborilmaydi
+            await _checkpoint(job_id, pending)
+            raise
+
+        job = await _checkpoint(job_id, pending, cursor_id=chat_ids[-1])
+        processed += len(pending)
+        pending.clear()
+
+        if job['status'] != 'running':
+            # To'xtatildi - resume yangi vazifa ochishi uchun darhol ro'yxatdan chiqamiz
+            _job_tasks.pop(job_id, None)
+            logger.info(f"Broadcast job {job_id} {job['status']}")
+            await _update_progress(bot, job)
+            return
+
+        now = time.monotonic()
+        if now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            await _update_progress(bot, job, processed / (now - started))
+
+    job = await _checkpoint(job_id, [], finished=True)
+    _job_tasks.pop(job_id, None)
+    elapsed = time.monotonic() - started
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    logger.info(
+        f"Broadcast job {job_id} finished: success={job['success']}, failed={job['failed']}, "
+        f"{rate:.1f} msg/s in {elapsed:.0f}s"
+    )
+
+    if job['repeat_interval']:
+        next_job = await _schedule_next_occurrence(job)
+        await _update_progress(
+            bot, job, rate,
+            text=format_job_progress(job, rate) + f"\n⏰ Keyingisi: {_format_time(next_job['scheduled_at'])}",
+            reply_markup=get_broadcast_job_keyboard(next_job['id'], next_job['status'])
+        )
+    else:
+        await _update_progress(bot, job, rate)
+
+
+def start_broadcast_job(bot: Bot, job_id: int):
+    """Job ni fonda ishga tushirish (allaqachon ishlayotgan bo'lsa - hech narsa qilmaydi)"""
+    task = _job_tasks.get(job_id)
+    if task is not None and not task.done():
+        return
+    _job_tasks[job_id] = asyncio.create_task(_run_job(bot, job_id))
+
+
+def _enqueue_job(job_id: int, scheduled_at: int):
+    _job_queue.run_once(
+        _scheduled_job_callback,
+        when=max(scheduled_at - time.time(), 0),
+        data=job_id,
+        name=f"broadcast_{job_id}"
+    )
+
+
+async def _scheduled_job_callback(context: ContextTypes.DEFAULT_TYPE):
+    """JobQueue: rejalashtirilgan vaqt keldi"""
+    job_id = context.job.data
+    job = await get_broadcast_job(job_id)
+    if job is None:
+        return
+
+    # Auditoriya shu paytdagi holat bo'yicha hisoblanadi
+    condition, params = segment_condition(job['segment'])
+    async with transaction() as db:
+        cursor = await db.execute(f'''
+            UPDATE broadcasts
+            SET status = 'running', started_at = CURRENT_TIMESTAMP,
+                total_users = (SELECT COUNT(*) FROM users u WHERE u.is_active = 1 AND {condition})
+            WHERE id = :job_id AND status = 'scheduled'
+        ''', {'job_id': job_id, **params})
+
+    if cursor.rowcount > 0:
+        start_broadcast_job(context.bot, job_id)
+
+
+async def schedule_broadcast_job(bot: Bot, job_id: int, scheduled_at: int = None,
+                                 spread_seconds: int = 0, repeat_interval: int = 0):
+    """Qoralamani yuborishga qo'yish: darhol yoki scheduled_at (unix vaqt) da"""
+    now = int(time.time())
+    start_now = scheduled_at is None or scheduled_at <= now
+
+    async with transaction() as db:
+        async with db.execute('''
+            UPDATE broadcasts
+            SET status = ?, scheduled_at = ?, spread_seconds = ?, repeat_interval = ?,
+                started_at = CASE WHEN ? THEN CURRENT_TIMESTAMP END
+            WHERE id = ? AND status = 'draft'
+            RETURNING *
+        ''', ('running' if start_now else 'scheduled', now if start_now else scheduled_at,
+              spread_seconds, repeat_interval, start_now, job_id)) as cursor:
+            job = await cursor.fetchone()
+
+    if job is None:
+        return None
+
+    if start_now:
+        start_broadcast_job(bot, job_id)
+    else:
+        _enqueue_job(job_id, job['scheduled_at'])
+        logger.info(f"Broadcast job {job_id} scheduled at {_format_time(job['scheduled_at'])}")
+    return job
+
+
+async def _schedule_next_occurrence(job):
+    """Takroriy reklama: keyingi nusxani rejalashtirish"""
+    next_at = job['scheduled_at'] + job['repeat_interval']
+    while next_at <= time.time():
+        next_at += job['repeat_interval']
+
+    async with transaction() as db:
+        async with db.execute('''
+            INSERT INTO broadcasts (message_type, content, segment, status, created_by, total_users,
+                                    success, failed, scheduled_at, spread_seconds, repeat_interval, progress_chat_id)
+            SELECT message_type, content, segment, 'scheduled', created_by, total_users,
+                   0, 0, ?, spread_seconds, repeat_interval, progress_chat_id
+            FROM broadcasts WHERE id = ?
+            RETURNING *
+        ''', (next_at, job['id'])) as cursor:
+            next_job = await cursor.fetchone()
+
+    _enqueue_job(next_job['id'], next_at)
+    logger.info(f"Broadcast job {job['id']} repeats as {next_job['id']} at {_format_time(next_at)}")
+    return next_job
+
+
+async def cancel_broadcast_job(job_id: int) -> bool:
+    """Hali boshlanmagan (qoralama yoki rejalashtirilgan) job ni bekor qilish"""
+    async with transaction() as db:
+        cursor = await db.execute(
+            "UPDATE broadcasts SET status = 'cancelled' WHERE id = ? AND status IN ('draft', 'scheduled')",
+            (job_id,)
+        )
+    if cursor.rowcount == 0:
+        return False
+
+    if _job_queue is not None:
+        for queued in _job_queue.get_jobs_by_name(f"broadcast_{job_id}"):
+            queued.schedule_removal()
+    return True
+
+
+async def pause_broadcast_job(job_id: int) -> bool:
+    """Joriy partiyadan keyin to'xtatish"""
+    async with transaction() as db:
+        cursor = await db.execute(
+            "UPDATE broadcasts SET status = 'paused' WHERE id = ? AND status = 'running'",
+            (job_id,)
+        )
+    return cursor.rowcount > 0
+
+
+async def resume_broadcast_job(bot: Bot, job_id: int) -> bool:
+    """To'xtatilgan job ni kursordan davom ettirish"""
+    async with transaction() as db:
+        cursor = await db.execute(
+            "UPDATE broadcasts SET status = 'running' WHERE id = ? AND status = 'paused'",
+            (job_id,)
+        )
+    if cursor.rowcount == 0:
+        return False
+    start_broadcast_job(bot, job_id)
+    return True
+
+
+async def resume_broadcast_jobs(application: Application):
+    """Startup: tugallanmagan joblarni davom ettirish, rejalashtirilganlarni JobQueue ga qaytarish"""
+    global _job_queue
+    _job_queue = application.job_queue
+
+    async with get_db() as db:
+        async with db.execute('''
+            SELECT id, status, scheduled_at FROM broadcasts
+            WHERE status IN ('running', 'scheduled')
+        ''') as cursor:
+            rows = await cursor.fetchall()
+
+    for row in rows:
+        if row['status'] == 'running':
+            logger.info(f"Resuming broadcast job {row['id']}")
+            start_broadcast_job(application.bot, row['id'])
+        else:
+            _enqueue_job(row['id'], row['scheduled_at'])
+
+
+async def stop_broadcast_jobs():
+    """Shutdown: joblar 'running' holatida qoladi va keyingi startda davom etadi"""
+    tasks = list(_job_tasks.values())
+    _job_tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
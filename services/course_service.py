@@ -1,9 +1,23 @@
-import aiosqlite
 import logging
-from config import DB_PATH
+from database.connection import get_db, transaction
 
 logger = logging.getLogger(__name__)
 
+# Kurslar keshi: id -> course. Faqat admin kursni o'zgartirganda tozalanadi
+_course_cache = {}
+_active_course_id = None
+_active_loaded = False
+_cache_generation = 0
+
+
+def invalidate_course_cache():
+    """Kurslar keshini tozalash (kurs o'zgarganda)"""
+    global _active_course_id, _active_loaded, _cache_generation
+    _course_cache.clear()
+    _active_course_id = None
+    _active_loaded = False
+    _cache_generation += 1
+
 
 async def create_course(
         name: str,
@@ -14,36 +28,55 @@ async def create_course(
         welcome_text: str = None
 ) -> int:
     """Yangi kurs yaratish"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction() as db:
         cursor = await db.execute('''
             INSERT INTO courses (name, description, welcome_text, price, channel_id, channel_url, is_active)
             VALUES (?, ?, ?, ?, ?, ?, 0)
         ''', (name, description, welcome_text, price, channel_id, channel_url))
-        await db.commit()
         logger.info(f"Course created: {name}")
         return cursor.lastrowid
 
 
 async def get_course(course_id: int):
     """Kursni ID bo'yicha olish"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    course = _course_cache.get(course_id)
+    if course is not None:
+        return course
+
+    generation = _cache_generation
+    async with get_db() as db:
         async with db.execute('SELECT * FROM courses WHERE id = ?', (course_id,)) as cursor:
-            return await cursor.fetchone()
+            course = await cursor.fetchone()
+
+    # So'rov davomida kesh tozalangan bo'lsa eski qiymatni saqlamaymiz
+    if course is not None and generation == _cache_generation:
+        _course_cache[course_id] = course
+    return course
 
 
 async def get_active_course():
     """Aktiv kursni olish"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    global _active_course_id, _active_loaded
+
+    if _active_loaded:
+        return _course_cache.get(_active_course_id) if _active_course_id else None
+
+    generation = _cache_generation
+    async with get_db() as db:
         async with db.execute('SELECT * FROM courses WHERE is_active = 1 LIMIT 1') as cursor:
-            return await cursor.fetchone()
+            course = await cursor.fetchone()
+
+    if generation == _cache_generation:
+        if course is not None:
+            _course_cache[course['id']] = course
+        _active_course_id = course['id'] if course else None
+        _active_loaded = True
+    return course
 
 
 async def get_all_courses():
     """Barcha kurslar ro'yxati"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         async with db.execute('SELECT * FROM courses ORDER BY created_at DESC') as cursor:
             return await cursor.fetchall()
 
@@ -58,7 +91,7 @@ async def update_course(
         channel_url: str = None
 ) -> bool:
     """Kursni yangilash"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction() as db:
         updates = []
         values = []
 
@@ -77,6 +110,11 @@ async def update_course(
         if channel_id is not None:
             updates.append("channel_id = ?")
             values.append(channel_id)
+            # Eski kanal uchun yaratilgan linklar endi yaroqsiz
+            await db.execute('''
+                DELETE FROM course_invite_links
+                WHERE course_id = ? AND claimed_by IS NULL AND channel_id != ?
+            ''', (course_id, channel_id))
         if channel_url is not None:
             updates.append("channel_url = ?")
             values.append(channel_url)
@@ -88,45 +126,53 @@ async def update_course(
         query = f"UPDATE courses SET {', '.join(updates)} WHERE id = ?"
 
         cursor = await db.execute(query, values)
-        await db.commit()
-        logger.info(f"Course updated: {course_id}")
-        return cursor.rowcount > 0
+
+    invalidate_course_cache()
+    logger.info(f"Course updated: {course_id}")
+    return cursor.rowcount > 0
 
 
 async def set_active_course(course_id: int) -> bool:
     """Kursni aktiv qilish (boshqalarini o'chirish)"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction() as db:
         # Avval barcha kurslarni noaktiv qilish
         await db.execute('UPDATE courses SET is_active = 0')
 
         # Tanlangan kursni aktiv qilish
         cursor = await db.execute('UPDATE courses SET is_active = 1 WHERE id = ?', (course_id,))
-        await db.commit()
-        logger.info(f"Active course set: {course_id}")
-        return cursor.rowcount > 0
+
+    invalidate_course_cache()
+    logger.info(f"Active course set: {course_id}")
+    return cursor.rowcount > 0
 
 
 async def deactivate_all_courses() -> bool:
     """Barcha kurslarni noaktiv qilish"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction() as db:
         await db.execute('UPDATE courses SET is_active = 0')
-        await db.commit()
-        logger.info("All courses deactivated")
-        return True
+
+    invalidate_course_cache()
+    logger.info("All courses deactivated")
+    return True
 
 
 async def delete_course(course_id: int) -> bool:
     """Kursni o'chirish"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction() as db:
         cursor = await db.execute('DELETE FROM courses WHERE id = ?', (course_id,))
-        await db.commit()
-        logger.info(f"Course deleted: {course_id}")
-        return cursor.rowcount > 0
+        await db.execute(
+            'DELETE FROM course_invite_links WHERE course_id = ? AND claimed_by IS NULL',
+            (course_id,)
+        )
+
+    invalidate_course_cache()
+    logger.info(f"Course deleted: {course_id}")
+    return cursor.rowcount > 0
 
 
 async def get_courses_count() -> int:
     """Kurslar sonini olish"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         async with db.execute('SELECT COUNT(*) FROM courses') as cursor:
             result = await cursor.fetchone()
             return result[0]
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from telegram import Bot
+from telegram.error import RetryAfter, TelegramError
+from config import INVITE_POOL_LOW, INVITE_POOL_TARGET, INVITE_POOL_INTERVAL
+from database.connection import get_db, transaction
+from services.course_service import get_course, get_active_course
+
+logger = logging.getLogger(__name__)
+
+_wakeup = asyncio.Event()
+_wanted_courses = set()
+_refill_task = None
+
+
+async def claim_invite_link(course_id: int, user_id: int) -> str | None:
+    """Puldan bir martalik linkni olish (Telegram API chaqirilmaydi)"""
+    async with transaction() as db:
+        async with db.execute('''
+            UPDATE course_invite_links
+            SET claimed_by = ?, claimed_at = CURRENT_TIMESTAMP
+            WHERE id = (
+                SELECT id FROM course_invite_links
+                WHERE course_id = ? AND claimed_by IS NULL
+                ORDER BY id
+                LIMIT 1
+            )
+            RETURNING invite_link
+        ''', (user_id, course_id)) as cursor:
+            row = await cursor.fetchone()
+
+    # Pul kamayganda fon vazifasi to'ldiradi
+    _wanted_courses.add(course_id)
+    _wakeup.set()
+
+    if row is None:
+        logger.warning(f"Invite pool empty for course: {course_id}")
+        return None
+    return row['invite_link']
+
+
+async def get_pool_size(course_id: int) -> int:
+    """Kurs uchun ishlatilmagan linklar soni"""
+    async with get_db() as db:
+        async with db.execute('''
+            SELECT COUNT(*) FROM course_invite_links
+            WHERE course_id = ? AND claimed_by IS NULL
+        ''', (course_id,)) as cursor:
+            result = await cursor.fetchone()
+            return result[0]
+
+
+async def refill_course(bot: Bot, course) -> int:
+    """Pul LOW dan kam bo'lsa TARGET gacha to'ldirish"""
+    available = await get_pool_size(course['id'])
+    if available >= INVITE_POOL_LOW:
+        return 0
+
+    created = 0
+    while available + created < INVITE_POOL_TARGET:
+        try:
+            invite = await bot.create_chat_invite_link(
+                chat_id=int(course['channel_id']),
+                member_limit=1
+            )
+        except RetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+            continue
+        except (TelegramError, ValueError) as e:
+            logger.error(f"Invite link yaratishda xato (course {course['id']}): {e}")
+            break
+
+        async with transaction() as db:
+            # Yaratish davomida kanal o'zgargan bo'lsa link saqlanmaydi
+            await db.execute('''
+                INSERT INTO course_invite_links (course_id, channel_id, invite_link)
+                SELECT id, channel_id, ? FROM courses
+                WHERE id = ? AND channel_id = ?
+            ''', (invite.invite_link, course['id'], course['channel_id']))
+        created += 1
+
+    if created:
+        logger.info(f"Invite pool refilled: course {course['id']}, +{created}")
+    return created
+
+
+async def _refill_loop(bot: Bot):
+    while True:
+        _wakeup.clear()
+
+        try:
+            courses = []
+            active = await get_active_course()
+            if active:
+                courses.append(active)
+
+            while _wanted_courses:
+                course = await get_course(_wanted_courses.pop())
+                if course and (not active or course['id'] != active['id']):
+                    courses.append(course)
+
+            for course in courses:
+                await refill_course(bot, course)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Invite pool refill error: {e}")
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=INVITE_POOL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_invite_pool(bot: Bot):
+    global _refill_task
+    if _refill_task is None:
+        _refill_task = asyncio.create_task(_refill_loop(bot))
+
+
+async def stop_invite_pool():
+    global _refill_task
+    if _refill_task is not None:
+        _refill_task.cancel()
+        try:
+            await _refill_task
+        except asyncio.CancelledError:
+            pass
+        _refill_task = None
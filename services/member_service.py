@@ -0,0 +1,38 @@
+from database.connection import get_db, transaction
+
+# Kanalga obuna bo'lgan hisoblanadigan statuslar
+SUBSCRIBED_STATUSES = ('member', 'administrator', 'creator')
+
+
+def channel_key(channel) -> str:
+    """Kanal ID yoki @username ni bir xil ko'rinishga keltirish"""
+    channel = str(channel).strip()
+    return channel.lower() if channel.startswith('@') else channel
+
+
+def chat_keys(chat) -> list:
+    """Telegram chat uchun kalitlar: ID va (bo'lsa) @username"""
+    keys = [str(chat.id)]
+    if chat.username:
+        keys.append(channel_key(f"@{chat.username}"))
+    return keys
+
+
+async def get_member_status(channel, user_id: int) -> str | None:
+    async with get_db() as db:
+        async with db.execute(
+                'SELECT status FROM channel_members WHERE channel_id = ? AND user_id = ?',
+                (channel_key(channel), user_id)
+        ) as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else None
+
+
+async def set_member_status(channels: list, user_id: int, status: str):
+    async with transaction() as db:
+        await db.executemany('''
+            INSERT INTO channel_members (channel_id, user_id, status) VALUES (?, ?, ?)
+            ON CONFLICT(channel_id, user_id) DO UPDATE SET
+                status = excluded.status,
+                updated_at = CURRENT_TIMESTAMP
+        ''', [(channel_key(channel), user_id, status) for channel in channels])
\ No newline at end of file
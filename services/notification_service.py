@@ -0,0 +1,206 @@
+import asyncio
+import json
+import logging
+import time
+from telegram import Bot
+from telegram.error import Forbidden
+from database.connection import transaction
+from services.course_service import get_course, get_active_course
+from services.invite_service import claim_invite_link
+from services.user_service import deactivate_users
+from utils.rate_limiter import PRIORITY_PAYMENT
+
+logger = logging.getLogger(__name__)
+
+# Outbox sozlamalari
+NOTIFICATION_BATCH_SIZE = 20
+NOTIFICATION_POLL_INTERVAL = 5
+NOTIFICATION_LEASE = 60  # yuborish davomida qatorni band qilish (soniya)
+NOTIFICATION_MAX_ATTEMPTS = 8
+NOTIFICATION_BACKOFF_BASE = 5
+NOTIFICATION_BACKOFF_MAX = 3600
+
+_wakeup = asyncio.Event()
+_worker_task = None
+
+
+async def enqueue_notification(kind: str, chat_id: int, payload: dict = None):
+    """Xabarni outbox ga yozish (chaqiruvchi tranzaksiyasi ichida bo'lsa, o'sha tranzaksiyada)"""
+    async with transaction() as db:
+        await db.execute('''
+            INSERT INTO notification_outbox (kind, chat_id, payload, next_attempt_at)
+            VALUES (?, ?, ?, ?)
+        ''', (kind, chat_id, json.dumps(payload or {}), int(time.time())))
+    _wakeup.set()
+
+
+async def send_payment_success(bot: Bot, chat_id: int, payload: dict):
+    """Muvaffaqiyatli to'lov haqida xabar yuborish"""
+    course_id = payload.get('course_id')
+
+    # Kurs ma'lumotlarini olish
+    if course_id:
+        course = await get_course(course_id)
+    else:
+        course = await get_active_course()
+
+    if not course:
+        # Doimiy xato: qator 'failed' bo'lib qoladi va qayta yuborish mumkin
+        raise ValueError(f"Course not found for success message: {course_id}")
+
+    channel_id = course['channel_id']
+    channel_url = course['channel_url']
+
+    # Qayta urinishda avval olingan link ishlatiladi - puldan yana link sarflanmaydi
+    invite_link = payload.get('invite_link')
+
+    # Avval oldindan yaratilgan puldan olinadi
+    if not invite_link:
+        invite_link = await claim_invite_link(course['id'], chat_id)
+        payload['invite_link'] = invite_link
+
+    # Pul bo'sh bo'lsa bir martalik invite link yaratish
+    if not invite_link:
+        try:
+            invite = await bot.create_chat_invite_link(
+                chat_id=int(channel_id),
+                member_limit=1
+            )
+            invite_link = payload['invite_link'] = invite.invite_link
+            logger.info(f"Invite link created for user: {chat_id}, course: {course_id}")
+        except Exception as e:
+            logger.error(f"Invite link yaratishda xato: {e}")
+            # Agar invite link yaratilmasa, channel_url ishlatiladi
+            invite_link = channel_url
+
+    # Xabar yuborish
+    if invite_link:
+        text = (
+            f"🎉 <b>Tabriklaymiz!</b>\n\n"
+            f"Siz <b>{course['name']}</b> kursiga muvaffaqiyatli to'lov qildingiz!\n\n"
+            f"🔗 Yopiq kanalga kirish uchun link:\n{invite_link}\n\n"
+            f"⚠️ Link faqat bir martalik!"
+        )
+    else:
+        text = (
+            f"🎉 <b>Tabriklaymiz!</b>\n\n"
+            f"Siz <b>{course['name']}</b> kursiga muvaffaqiyatli to'lov qildingiz!\n\n"
+            f"⚠️ Admin siz bilan tez orada bog'lanadi."
+        )
+
+    await bot.send_message(
+        chat_id=chat_id,
+        text=text,
+        parse_mode='HTML',
+        rate_limit_args=PRIORITY_PAYMENT
+    )
+    logger.info(f"Success message sent to user: {chat_id}")
+
+
+# Xabar turi -> yuboruvchi funksiya
+NOTIFICATION_HANDLERS = {
+    'payment_success': send_payment_success,
+}
+
+
+async def _claim_due_notifications() -> list:
+    """Vaqti kelgan xabarlarni olish va ularni vaqtincha band qilish"""
+    now = int(time.time())
+
+    # Yozish tranzaksiyasi orqali o'qiymiz: hali commit bo'lmagan outbox yozuvini kutamiz
+    async with transaction() as db:
+        async with db.execute('''
+            SELECT * FROM notification_outbox
+            WHERE status = 'pending' AND next_attempt_at <= ?
+            ORDER BY next_attempt_at
+            LIMIT ?
+        ''', (now, NOTIFICATION_BATCH_SIZE)) as cursor:
+            rows = await cursor.fetchall()
+
+        if rows:
+            await db.executemany(
+                'UPDATE notification_outbox SET next_attempt_at = ? WHERE id = ?',
+                [(now + NOTIFICATION_LEASE, row['id']) for row in rows]
+            )
+    return rows
+
+
+async def _deliver(bot: Bot, row):
+    handler = NOTIFICATION_HANDLERS.get(row['kind'])
+    # Yuboruvchi payload ga yozgan qiymatlar (masalan invite link) keyingi urinishga saqlanadi
+    payload = json.loads(row['payload'])
+
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown notification kind: {row['kind']}")
+        await handler(bot, row['chat_id'], payload)
+    except Exception as e:
+        attempts = row['attempts'] + 1
+
+        # Bot bloklangan bo'lsa qayta urinishdan foyda yo'q
+        if isinstance(e, (Forbidden, ValueError)) or attempts >= NOTIFICATION_MAX_ATTEMPTS:
+            status = 'failed'
+            next_attempt_at = row['next_attempt_at']
+            logger.error(f"Notification {row['id']} failed permanently: {e}")
+            if isinstance(e, Forbidden):
+                await deactivate_users([row['chat_id']])
+        else:
+            status = 'pending'
+            delay = min(NOTIFICATION_BACKOFF_BASE * 2 ** (attempts - 1), NOTIFICATION_BACKOFF_MAX)
+            next_attempt_at = int(time.time()) + delay
+            logger.warning(f"Notification {row['id']} failed (attempt {attempts}), retry in {delay}s: {e}")
+
+        async with transaction() as db:
+            await db.execute('''
+                UPDATE notification_outbox
+                SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, payload = ?
+                WHERE id = ?
+            ''', (status, attempts, next_attempt_at, str(e)[:500], json.dumps(payload), row['id']))
+        return
+
+    async with transaction() as db:
+        await db.execute('''
+            UPDATE notification_outbox
+            SET status = 'sent', attempts = attempts + 1, sent_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (row['id'],))
+
+
+async def _outbox_loop(bot: Bot):
+    while True:
+        _wakeup.clear()
+
+        try:
+            rows = await _claim_due_notifications()
+            await asyncio.gather(*(_deliver(bot, row) for row in rows))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Notification outbox error: {e}")
+            rows = []
+
+        # To'liq partiya - navbatda yana bo'lishi mumkin
+        if len(rows) >= NOTIFICATION_BATCH_SIZE:
+            continue
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=NOTIFICATION_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_notification_worker(bot: Bot):
+    global _worker_task
+    if _worker_task is None:
+        _worker_task = asyncio.create_task(_outbox_loop(bot))
+
+
+async def stop_notification_worker():
+    global _worker_task
+    if _worker_task is not None:
+        _worker_task.cancel()
+        try:
+            await _worker_task
+        except asyncio.CancelledError:
+            pass
+        _worker_task = None
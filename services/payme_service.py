@@ -1,7 +1,9 @@
-import aiosqlite
 import logging
-from config import DB_PATH
+from database.connection import get_db, transaction
+from services.user_service import ensure_user_written
+from services.notification_service import enqueue_notification
 from datetime import datetime
+import time
 import uuid
 
 logger = logging.getLogger(__name__)
@@ -11,21 +13,85 @@ async def create_order(user_id: int, amount: int, course_id: int = None) -> str:
     """Yangi order yaratish"""
     order_id = str(uuid.uuid4().hex)[:16]
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction() as db:
         await db.execute('''
-            INSERT INTO payme_transactions (user_id, order_id, amount, course_id, state)
-            VALUES (?, ?, ?, ?, 0)
-        ''', (user_id, order_id, amount, course_id))
-        await db.commit()
+            INSERT INTO payme_transactions (user_id, order_id, amount, course_id, state, create_time)
+            VALUES (?, ?, ?, ?, 0, ?)
+        ''', (user_id, order_id, amount, course_id, int(time.time() * 1000)))
         logger.info(f"Order created: {order_id}, user: {user_id}, course: {course_id}")
 
     return order_id
 
 
+async def create_payme_transaction(payme_transaction_id: str, user_id: int, course_id: int, amount: int):
+    """CreateTransaction: tekshirish va yaratish bitta BEGIN IMMEDIATE tranzaksiyada
+
+    Natija (status, order):
+        'exists' - shu payme_id bilan tranzaksiya bor
+        'busy' - foydalanuvchida shu kurs uchun boshqa pending tranzaksiya bor
+        'created' - yangi tranzaksiya yaratildi (state = 1)
+    """
+    order_id = str(uuid.uuid4().hex)[:16]
+
+    async with transaction() as db:
+        async with db.execute(
+                'SELECT * FROM payme_transactions WHERE payme_transaction_id = ?',
+                (payme_transaction_id,)
+        ) as cursor:
+            existing = await cursor.fetchone()
+        if existing:
+            return 'exists', existing
+
+        async with db.execute('''
+            SELECT * FROM payme_transactions
+            WHERE user_id = ? AND course_id = ? AND state = 1
+            LIMIT 1
+        ''', (user_id, course_id)) as cursor:
+            pending = await cursor.fetchone()
+        if pending:
+            return 'busy', pending
+
+        async with db.execute('''
+            INSERT INTO payme_transactions
+                (user_id, order_id, payme_transaction_id, amount, course_id, state, create_time)
+            VALUES (?, ?, ?, ?, ?, 1, ?)
+            RETURNING *
+        ''', (user_id, order_id, payme_transaction_id, amount, course_id, int(time.time() * 1000))) as cursor:
+            order = await cursor.fetchone()
+
+    logger.info(f"Order created: {order_id}, user: {user_id}, course: {course_id}, payme: {payme_transaction_id}")
+    return 'created', order
+
+
+async def resolve_account(user_id: int, course_id: int = None):
+    """Payme account uchun bitta so'rov: user bormi, kurs (yoki aktiv kurs) va pending tranzaksiya"""
+    # /start da navbatga qo'yilgan foydalanuvchi ham ko'rinishi kerak
+    await ensure_user_written(user_id)
+
+    async with get_db() as db:
+        async with db.execute('''
+            SELECT
+                :user_id AS user_id,
+                u.chat_id IS NOT NULL AS user_exists,
+                c.id AS course_id,
+                c.price AS course_price,
+                c.id IS NOT NULL AND EXISTS (
+                    SELECT 1 FROM payme_transactions p
+                    WHERE p.user_id = :user_id AND p.course_id = c.id AND p.state = 1
+                ) AS has_pending
+            FROM (SELECT 1)
+            LEFT JOIN users u ON u.chat_id = :user_id
+            LEFT JOIN courses c ON c.id = IFNULL(
+                :course_id,
+                (SELECT id FROM courses WHERE is_active = 1 LIMIT 1)
+            )
+        ''', {'user_id': user_id, 'course_id': course_id}) as cursor:
+            return await cursor.fetchone()
+
+
 async def get_order_by_id(order_id: str):
     """Order ID bo'yicha olish"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         async with db.execute(
                 'SELECT * FROM payme_transactions WHERE order_id = ?',
                 (order_id,)
@@ -35,8 +101,7 @@ async def get_order_by_id(order_id: str):
 
 async def get_order_by_payme_id(payme_transaction_id: str):
     """Payme transaction ID bo'yicha olish"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         async with db.execute(
                 'SELECT * FROM payme_transactions WHERE payme_transaction_id = ?',
                 (payme_transaction_id,)
@@ -46,8 +111,7 @@ async def get_order_by_payme_id(payme_transaction_id: str):
 
 async def get_user_orders(user_id: int):
     """Foydalanuvchi orderlari"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         async with db.execute('''
             SELECT * FROM payme_transactions 
             WHERE user_id = ? 
@@ -58,7 +122,7 @@ async def get_user_orders(user_id: int):
 
 async def update_order_state(order_id: str, state: int, payme_transaction_id: str = None):
     """Order holatini yangilash"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction() as db:
         if payme_transaction_id:
             await db.execute('''
                 UPDATE payme_transactions 
@@ -71,97 +135,104 @@ async def update_order_state(order_id: str, state: int, payme_transaction_id: st
                 SET state = ?
                 WHERE order_id = ?
             ''', (state, order_id))
-        await db.commit()
 
 
-async def set_order_perform_time(order_id: str):
-    """To'lov vaqtini belgilash"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute('''
+async def set_order_perform_time(order_id: str) -> bool:
+    """To'lov vaqtini belgilash va muvaffaqiyat xabarini outbox ga yozish (bitta tranzaksiyada)"""
+    async with transaction() as db:
+        async with db.execute('''
             UPDATE payme_transactions 
             SET state = 2, perform_time = ?
-            WHERE order_id = ?
-        ''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), order_id))
-        await db.commit()
+            WHERE order_id = ? AND state = 1
+            RETURNING user_id, course_id
+        ''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), order_id)) as cursor:
+            order = await cursor.fetchone()
+
+        # Parallel PerformTransaction da xabar faqat bir marta yoziladi
+        if order is None:
+            return False
+
+        await db.execute('''
+            INSERT OR IGNORE INTO course_enrollments (user_id, course_id)
+            VALUES (?, IFNULL(?, 0))
+        ''', (order['user_id'], order['course_id']))
+        await enqueue_notification('payment_success', order['user_id'], {'course_id': order['course_id']})
+    return True
 
 
 async def set_order_cancel_time(order_id: str, reason: int, state: int = -1):
     """Bekor qilish vaqtini belgilash"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute('''
+    async with transaction() as db:
+        async with db.execute('''
             UPDATE payme_transactions 
             SET state = ?, reason = ?, cancel_time = ?
             WHERE order_id = ?
-        ''', (state, reason, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), order_id))
-        await db.commit()
+            RETURNING user_id, course_id
+        ''', (state, reason, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), order_id)) as cursor:
+            order = await cursor.fetchone()
+
+        # Bajarilgan to'lov qaytarilsa - boshqa muvaffaqiyatli to'lov bo'lmasa kursdan chiqariladi
+        if order is not None and state == -2:
+            await db.execute('''
+                DELETE FROM course_enrollments
+                WHERE user_id = :user_id AND course_id = IFNULL(:course_id, 0)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM payme_transactions
+                      WHERE user_id = :user_id AND course_id IS :course_id AND state = 2
+                  )
+            ''', {'user_id': order['user_id'], 'course_id': order['course_id']})
 
 
 async def has_successful_payment(user_id: int, course_id: int = None) -> bool:
-    """Foydalanuvchi muvaffaqiyatli to'lov qilganmi (kurs bo'yicha)"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    """Foydalanuvchi muvaffaqiyatli to'lov qilganmi (kurs bo'yicha, course_enrollments PK)"""
+    async with get_db() as db:
         if course_id:
             async with db.execute('''
-                SELECT COUNT(*) FROM payme_transactions 
-                WHERE user_id = ? AND course_id = ? AND state = 2
+                SELECT 1 FROM course_enrollments
+                WHERE user_id = ? AND course_id = ?
             ''', (user_id, course_id)) as cursor:
-                count = (await cursor.fetchone())[0]
+                row = await cursor.fetchone()
         else:
             async with db.execute('''
-                SELECT COUNT(*) FROM payme_transactions 
-                WHERE user_id = ? AND state = 2
+                SELECT 1 FROM course_enrollments
+                WHERE user_id = ?
+                LIMIT 1
             ''', (user_id,)) as cursor:
-                count = (await cursor.fetchone())[0]
-        return count > 0
+                row = await cursor.fetchone()
+        return row is not None
 
 
 async def get_payme_stats() -> dict:
-    """Payme statistikasi"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Jami
-        async with db.execute('SELECT COUNT(*) FROM payme_transactions') as cursor:
-            total = (await cursor.fetchone())[0]
-
-        # Success
-        async with db.execute('SELECT COUNT(*) FROM payme_transactions WHERE state = 2') as cursor:
-            success = (await cursor.fetchone())[0]
-
-        # Pending
-        async with db.execute('SELECT COUNT(*) FROM payme_transactions WHERE state IN (0, 1)') as cursor:
-            pending = (await cursor.fetchone())[0]
-
-        # Cancelled
-        async with db.execute('SELECT COUNT(*) FROM payme_transactions WHERE state IN (-1, -2)') as cursor:
-            cancelled = (await cursor.fetchone())[0]
-
-        # Jami summa (success)
-        async with db.execute('SELECT SUM(amount) FROM payme_transactions WHERE state = 2') as cursor:
-            total_amount = (await cursor.fetchone())[0] or 0
-
-        return {
-            'total': total,
-            'success': success,
-            'pending': pending,
-            'cancelled': cancelled,
-            'total_amount': total_amount
-        }
-
-
-async def get_orders_by_time_range(start_time: int, end_time: int):
-    """Vaqt oralig'idagi orderlar (GetStatement uchun)"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    """Payme statistikasi (payme_counters hisoblagichlaridan)"""
+    async with get_db() as db:
         async with db.execute('''
-            SELECT * FROM payme_transactions 
-            WHERE state = 2
-            ORDER BY perform_time
+            SELECT
+                IFNULL(SUM(count), 0) AS total,
+                IFNULL(SUM(CASE WHEN state = 2 THEN count END), 0) AS success,
+                IFNULL(SUM(CASE WHEN state IN (0, 1) THEN count END), 0) AS pending,
+                IFNULL(SUM(CASE WHEN state IN (-1, -2) THEN count END), 0) AS cancelled,
+                IFNULL(SUM(CASE WHEN state = 2 THEN amount END), 0) AS total_amount
+            FROM payme_counters
         ''') as cursor:
-            return await cursor.fetchall()
+            return dict(await cursor.fetchone())
+
+
+async def iter_orders_by_time_range(start_time: int, end_time: int):
+    """Vaqt oralig'idagi Payme tranzaksiyalari (GetStatement uchun, kursordan oqim bilan)"""
+    async with get_db() as db:
+        async with db.execute('''
+            SELECT * FROM payme_transactions
+            WHERE create_time >= ? AND create_time <= ?
+              AND payme_transaction_id IS NOT NULL
+            ORDER BY create_time
+        ''', (start_time, end_time)) as cursor:
+            async for order in cursor:
+                yield order
 
 
 async def get_recent_orders(limit: int = 10):
     """Oxirgi orderlar"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         async with db.execute('''
             SELECT pt.*, c.name as course_name
             FROM payme_transactions pt
@@ -174,8 +245,7 @@ async def get_recent_orders(limit: int = 10):
 
 async def get_pending_order_by_user(user_id: int, course_id: int = None):
     """Foydalanuvchining pending orderini olish (kurs bo'yicha)"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         if course_id:
             async with db.execute('''
                 SELECT * FROM payme_transactions 
@@ -195,28 +265,14 @@ async def get_pending_order_by_user(user_id: int, course_id: int = None):
 
 
 async def get_course_stats(course_id: int) -> dict:
-    """Kurs bo'yicha statistika"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Jami
-        async with db.execute('''
-            SELECT COUNT(*) FROM payme_transactions WHERE course_id = ?
-        ''', (course_id,)) as cursor:
-            total = (await cursor.fetchone())[0]
-
-        # Success
+    """Kurs bo'yicha statistika (payme_counters hisoblagichlaridan)"""
+    async with get_db() as db:
         async with db.execute('''
-            SELECT COUNT(*) FROM payme_transactions WHERE course_id = ? AND state = 2
+            SELECT
+                IFNULL(SUM(count), 0) AS total,
+                IFNULL(SUM(CASE WHEN state = 2 THEN count END), 0) AS success,
+                IFNULL(SUM(CASE WHEN state = 2 THEN amount END), 0) AS total_amount
+            FROM payme_counters
+            WHERE course_id = ?
         ''', (course_id,)) as cursor:
-            success = (await cursor.fetchone())[0]
-
-        # Jami summa
-        async with db.execute('''
-            SELECT SUM(amount) FROM payme_transactions WHERE course_id = ? AND state = 2
-        ''', (course_id,)) as cursor:
-            total_amount = (await cursor.fetchone())[0] or 0
-
-        return {
-            'total': total,
-            'success': success,
-            'total_amount': total_amount
-        }
\ No newline at end of file
+            return dict(await cursor.fetchone())
\ No newline at end of file
@@ -1,28 +1,24 @@
-import aiosqlite
-from config import DB_PATH
+from database.connection import get_db, transaction
 from datetime import datetime
 
 
 async def create_payment(chat_id: int, screenshot_file_id: str, amount: int = 97000) -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction() as db:
         cursor = await db.execute('''
             INSERT INTO payments (chat_id, amount, screenshot_file_id, status)
             VALUES (?, ?, ?, 'pending')
         ''', (chat_id, amount, screenshot_file_id))
-        await db.commit()
         return cursor.lastrowid
 
 
 async def get_payment(payment_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         async with db.execute('SELECT * FROM payments WHERE id = ?', (payment_id,)) as cursor:
             return await cursor.fetchone()
 
 
 async def get_pending_payments():
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         async with db.execute('''
             SELECT * FROM payments WHERE status = 'pending' ORDER BY created_at DESC
         ''') as cursor:
@@ -30,8 +26,7 @@ async def get_pending_payments():
 
 
 async def get_user_payments(chat_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         async with db.execute('''
             SELECT * FROM payments WHERE chat_id = ? ORDER BY created_at DESC
         ''', (chat_id,)) as cursor:
@@ -39,29 +34,27 @@ async def get_user_payments(chat_id: int):
 
 
 async def confirm_payment(payment_id: int, confirmed_by: int) -> bool:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction() as db:
         cursor = await db.execute('''
             UPDATE payments 
             SET status = 'confirmed', confirmed_at = ?, confirmed_by = ?
             WHERE id = ? AND status = 'pending'
         ''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), confirmed_by, payment_id))
-        await db.commit()
         return cursor.rowcount > 0
 
 
 async def reject_payment(payment_id: int, confirmed_by: int) -> bool:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction() as db:
         cursor = await db.execute('''
             UPDATE payments 
             SET status = 'rejected', confirmed_at = ?, confirmed_by = ?
             WHERE id = ? AND status = 'pending'
         ''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), confirmed_by, payment_id))
-        await db.commit()
         return cursor.rowcount > 0
 
 
 async def get_payment_stats() -> dict:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         # Jami to'lovlar
         async with db.execute('SELECT COUNT(*) FROM payments') as cursor:
             total = (await cursor.fetchone())[0]
@@ -92,7 +85,7 @@ async def get_payment_stats() -> dict:
 
 
 async def has_confirmed_payment(chat_id: int) -> bool:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         async with db.execute('''
             SELECT COUNT(*) FROM payments WHERE chat_id = ? AND status = 'confirmed'
         ''', (chat_id,)) as cursor:
@@ -0,0 +1,82 @@
+import logging
+import time
+from database.connection import get_db
+
+logger = logging.getLogger(__name__)
+
+# "To'lov kutilmoqda" segmenti: shu vaqtdan eski ochiq tranzaksiyalar (soniya)
+PENDING_AGE = 3600
+
+SEGMENT_TITLES = {
+    'all': "👥 Barcha foydalanuvchilar",
+    'paid': "💳 To'lov qilganlar",
+    'unpaid': "🆓 To'lov qilmaganlar",
+    'recent': "🆕 Yangi foydalanuvchilar",
+    'pending': "⏳ To'lovi tugallanmaganlar",
+}
+
+
+def parse_segment(segment: str) -> tuple:
+    """'paid:3' -> ('paid', 3). Noto'g'ri segmentda ValueError"""
+    kind, _, arg = segment.partition(':')
+    if kind in ('all', 'unpaid', 'pending') and not arg:
+        return kind, None
+    if kind in ('paid', 'recent') and arg.isdigit():
+        return kind, int(arg)
+    raise ValueError(f"Unknown segment: {segment}")
+
+
+def segment_condition(segment: str) -> tuple:
+    """Segment -> users (u) ustidagi WHERE sharti va nomlangan parametrlar.
+
+    Har bir shart indeks orqali ishlaydi: course_enrollments(course_id),
+    users(joined_at), payme_transactions(state, create_time).
+    """
+    kind, arg = parse_segment(segment)
+
+    if kind == 'paid':
+        return (
+            'u.chat_id IN (SELECT user_id FROM course_enrollments WHERE course_id = :segment_course)',
+            {'segment_course': arg}
+        )
+    if kind == 'unpaid':
+        return (
+            'NOT EXISTS (SELECT 1 FROM course_enrollments e WHERE e.user_id = u.chat_id)',
+            {}
+        )
+    if kind == 'recent':
+        return (
+            "u.joined_at >= datetime('now', :segment_since)",
+            {'segment_since': f'-{arg} days'}
+        )
+    if kind == 'pending':
+        return (
+            '''u.chat_id IN (
+                SELECT user_id FROM payme_transactions
+                WHERE state = 1 AND create_time < :segment_cutoff
+            )''',
+            {'segment_cutoff': int((time.time() - PENDING_AGE) * 1000)}
+        )
+    return '1', {}
+
+
+def segment_title(segment: str, course_name: str = None) -> str:
+    kind, arg = parse_segment(segment)
+    title = SEGMENT_TITLES[kind]
+    if kind == 'paid':
+        return f"{title}: {course_name or arg}"
+    if kind == 'recent':
+        return f"{title} ({arg} kun)"
+    return title
+
+
+async def count_segment(segment: str) -> int:
+    """Segmentdagi aktiv foydalanuvchilar soni (yuborishdan oldin ko'rsatish uchun)"""
+    condition, params = segment_condition(segment)
+    async with get_db() as db:
+        async with db.execute(
+            f'SELECT COUNT(*) FROM users u WHERE u.is_active = 1 AND {condition}',
+            params
+        ) as cursor:
+            result = await cursor.fetchone()
+            return result[0]
@@ -1,32 +1,79 @@
-import aiosqlite
-from config import DB_PATH
+import time
+from typing import Any, Callable, NamedTuple
+from config import SETTINGS_REFRESH_INTERVAL
+from database.connection import get_db, transaction
+
+class Setting(NamedTuple):
+    default: Any
+    parse: Callable[[str], Any]
+    dump: Callable[[Any], str]
+
+# Ma'lum sozlamalar va ularning turlari (bazada matn sifatida saqlanadi)
+SETTINGS = {
+    'force_subscribe': Setting(False, lambda value: value == 'on', lambda value: 'on' if value else 'off'),
+    'channel_id': Setting(None, str, str),
+}
+
+# Xotiradagi settings jadvali: key -> value
+_settings = {}
+_loaded_at = None
+_generation = 0
+
+async def load_settings():
+    """Butun settings jadvalini xotiraga yuklash"""
+    global _settings, _loaded_at
+
+    generation = _generation
+    async with get_db() as db:
+        async with db.execute('SELECT key, value FROM settings') as cursor:
+            settings = {row['key']: row['value'] for row in await cursor.fetchall()}
+
+    # Yuklash davomida set_setting chaqirilgan bo'lsa, keyingi o'qishda qayta yuklanadi
+    if generation == _generation:
+        _settings = settings
+        _loaded_at = time.monotonic()
+
+async def _ensure_fresh():
+    # Boshqa jarayon o'zgartirgan bo'lishi mumkin - vaqti-vaqti bilan qayta yuklaymiz
+    if _loaded_at is None or time.monotonic() - _loaded_at > SETTINGS_REFRESH_INTERVAL:
+        await load_settings()
 
 async def get_setting(key: str) -> str | None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute('SELECT value FROM settings WHERE key = ?', (key,)) as cursor:
-            result = await cursor.fetchone()
-            return result[0] if result else None
+    await _ensure_fresh()
+    return _settings.get(key)
 
 async def set_setting(key: str, value: str):
-    async with aiosqlite.connect(DB_PATH) as db:
+    global _generation
+
+    async with transaction() as db:
         await db.execute('''
             INSERT INTO settings (key, value) VALUES (?, ?)
             ON CONFLICT(key) DO UPDATE SET value = ?
         ''', (key, value, value))
-        await db.commit()
+
+    _settings[key] = value
+    _generation += 1
+
+async def get_setting_value(key: str):
+    """Sozlamani o'z turida olish"""
+    setting = SETTINGS[key]
+    value = await get_setting(key)
+    return setting.default if value is None else setting.parse(value)
+
+async def set_setting_value(key: str, value):
+    await set_setting(key, SETTINGS[key].dump(value))
 
 async def is_force_subscribe_enabled() -> bool:
-    value = await get_setting('force_subscribe')
-    return value == 'on'
+    return await get_setting_value('force_subscribe')
 
 async def enable_force_subscribe():
-    await set_setting('force_subscribe', 'on')
+    await set_setting_value('force_subscribe', True)
 
 async def disable_force_subscribe():
-    await set_setting('force_subscribe', 'off')
+    await set_setting_value('force_subscribe', False)
 
 async def get_channel_id() -> str | None:
-    return await get_setting('channel_id')
+    return await get_setting_value('channel_id')
 
 async def set_channel_id(channel_id: str):
-    await set_setting('channel_id', channel_id)
\ No newline at end of file
+    await set_setting_value('channel_id', channel_id)
\ No newline at end of file
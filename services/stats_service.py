@@ -1,61 +1,46 @@
-import aiosqlite
-from config import DB_PATH
+from database.connection import get_db
 from datetime import datetime, timedelta
 
+# Barcha ko'rsatkichlar users_daily jadvalidan bitta so'rovda hisoblanadi
+STATS_QUERY = '''
+    SELECT
+        IFNULL(SUM(CASE WHEN day = :today THEN joined END), 0) AS daily,
+        IFNULL(SUM(CASE WHEN day >= :week_ago THEN joined END), 0) AS weekly,
+        IFNULL(SUM(CASE WHEN day >= :month_ago THEN joined END), 0) AS monthly,
+        IFNULL(SUM(CASE WHEN day >= :year_ago THEN joined END), 0) AS yearly,
+        IFNULL(SUM(joined), 0) AS total,
+        IFNULL(SUM(active), 0) AS active
+    FROM users_daily
+'''
+
+def _days_ago(days: int) -> str:
+    return (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+
+async def get_all_stats() -> dict:
+    params = {
+        'today': _days_ago(0),
+        'week_ago': _days_ago(7),
+        'month_ago': _days_ago(30),
+        'year_ago': _days_ago(365)
+    }
+    async with get_db() as db:
+        async with db.execute(STATS_QUERY, params) as cursor:
+            return dict(await cursor.fetchone())
+
 async def get_daily_stats() -> int:
-    today = datetime.now().strftime('%Y-%m-%d')
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute('''
-            SELECT COUNT(*) FROM users WHERE DATE(joined_at) = ?
-        ''', (today,)) as cursor:
-            result = await cursor.fetchone()
-            return result[0]
+    return (await get_all_stats())['daily']
 
 async def get_weekly_stats() -> int:
-    week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute('''
-            SELECT COUNT(*) FROM users WHERE DATE(joined_at) >= ?
-        ''', (week_ago,)) as cursor:
-            result = await cursor.fetchone()
-            return result[0]
+    return (await get_all_stats())['weekly']
 
 async def get_monthly_stats() -> int:
-    month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute('''
-            SELECT COUNT(*) FROM users WHERE DATE(joined_at) >= ?
-        ''', (month_ago,)) as cursor:
-            result = await cursor.fetchone()
-            return result[0]
+    return (await get_all_stats())['monthly']
 
 async def get_yearly_stats() -> int:
-    year_ago = (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute('''
-            SELECT COUNT(*) FROM users WHERE DATE(joined_at) >= ?
-        ''', (year_ago,)) as cursor:
-            result = await cursor.fetchone()
-            return result[0]
+    return (await get_all_stats())['yearly']
 
 async def get_total_stats() -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute('SELECT COUNT(*) FROM users') as cursor:
-            result = await cursor.fetchone()
-            return result[0]
+    return (await get_all_stats())['total']
 
 async def get_active_users_count() -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute('SELECT COUNT(*) FROM users WHERE is_active = 1') as cursor:
-            result = await cursor.fetchone()
-            return result[0]
-
-async def get_all_stats() -> dict:
-    return {
-        'daily': await get_daily_stats(),
-        'weekly': await get_weekly_stats(),
-        'monthly': await get_monthly_stats(),
-        'yearly': await get_yearly_stats(),
-        'total': await get_total_stats(),
-        'active': await get_active_users_count()
-    }
\ No newline at end of file
+    return (await get_all_stats())['active']
\ No newline at end of file
@@ -1,45 +1,191 @@
-import aiosqlite
-from config import DB_PATH
+import asyncio
+import logging
+import sqlite3
+from config import USER_BUFFER_INTERVAL, USER_BUFFER_SIZE
+from database.connection import get_db, transaction
+
+logger = logging.getLogger(__name__)
+
+# Yozilishi kutilayotgan foydalanuvchilar: chat_id -> (first_name, last_name, username)
+_pending_users = {}
+_buffer_full = asyncio.Event()
+_flush_lock = asyncio.Lock()
+_flush_task = None
+
+# Keyset o'qishda bitta partiya hajmi
+USER_PAGE_SIZE = 1000
+
+# Ketma-ket shuncha xatodan keyin partiya bittalab yoziladi
+USER_FLUSH_ATTEMPTS = 5
+# Xatolardan keyin qayta urinish oralig'ining yuqori chegarasi (soniya)
+USER_FLUSH_MAX_DELAY = 30
+# Faqat shu qatorning o'ziga tegishli xatolar - qator tashlab yuboriladi
+USER_ROW_ERRORS = (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError,
+                   TypeError, ValueError)
+_flush_failures = 0
+
+# Botni bloklab, qayta /start bosganlar yana aktiv bo'ladi
+_INSERT_USER_SQL = '''
+    INSERT INTO users (chat_id, first_name, last_name, username)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(chat_id) DO UPDATE SET is_active = 1
+    WHERE users.is_active = 0
+'''
 
 async def add_user(chat_id: int, first_name: str, last_name: str, username: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute('''
-            INSERT OR IGNORE INTO users (chat_id, first_name, last_name, username)
-            VALUES (?, ?, ?, ?)
-        ''', (chat_id, first_name, last_name, username))
-        await db.commit()
+    """Foydalanuvchini navbatga qo'yish - bir necha ms ichida guruh bo'lib yoziladi"""
+    _pending_users[chat_id] = (first_name, last_name, username)
+
+    if _flush_task is None:
+        # Buffer ishga tushirilmagan (masalan skriptlarda) - darhol yozish
+        await flush_users()
+    elif len(_pending_users) >= USER_BUFFER_SIZE:
+        _buffer_full.set()
+
+async def flush_users():
+    """Navbatdagi foydalanuvchilarni bitta tranzaksiyada yozish"""
+    global _flush_failures
+    async with _flush_lock:
+        if not _pending_users:
+            return
+
+        rows = [(chat_id, *data) for chat_id, data in _pending_users.items()]
+        _pending_users.clear()
+        _buffer_full.clear()
+
+        try:
+            async with transaction() as db:
+                await db.executemany(_INSERT_USER_SQL, rows)
+        except asyncio.CancelledError:
+            _requeue_users(rows)
+            raise
+        except Exception as e:
+            _flush_failures += 1
+            logger.error(f"User buffer flush failed ({len(rows)} rows, attempt {_flush_failures}): {e}")
+            if _flush_failures < USER_FLUSH_ATTEMPTS:
+                _requeue_users(rows)
+            else:
+                # Bitta buzuq qator butun navbatni to'sib qo'ymasligi uchun
+                await _flush_one_by_one(rows)
+        else:
+            _flush_failures = 0
+
+async def _flush_one_by_one(rows):
+    global _flush_failures
+    for i, row in enumerate(rows):
+        try:
+            async with transaction() as db:
+                await db.execute(_INSERT_USER_SQL, row)
+        except asyncio.CancelledError:
+            _requeue_users(rows[i:])
+            raise
+        except USER_ROW_ERRORS as e:
+            logger.error(f"User {row[0]} dropped from buffer: {e}")
+        except Exception as e:
+            # Baza bilan bog'liq xato (locked, disk) - qolganlari keyinroq yoziladi
+            logger.error(f"User buffer flush failed ({len(rows) - i} rows left): {e}")
+            _requeue_users(rows[i:])
+            return
+    _flush_failures = 0
+
+def _requeue_users(rows):
+    for chat_id, *data in rows:
+        _pending_users.setdefault(chat_id, tuple(data))
+
+async def ensure_user_written(chat_id: int):
+    # Read-your-writes: navbatda yoki yozilayotgan bo'lsa kutamiz
+    if chat_id in _pending_users or _flush_lock.locked():
+        await flush_users()
+
+def _flush_delay() -> float:
+    """Xatolardan keyin qayta urinish oralig'i eksponensial oshadi"""
+    if not _flush_failures:
+        return USER_BUFFER_INTERVAL
+    return min(USER_BUFFER_INTERVAL * 2 ** min(_flush_failures, 10), USER_FLUSH_MAX_DELAY)
+
+async def _flush_loop():
+    while True:
+        try:
+            await asyncio.wait_for(_buffer_full.wait(), timeout=_flush_delay())
+        except asyncio.TimeoutError:
+            pass
+        await flush_users()
+
+def start_user_buffer():
+    global _flush_task
+    if _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_loop())
+
+async def stop_user_buffer():
+    """Fon taskini to'xtatish va qolgan yozuvlarni yozish (shutdown)"""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        _flush_task = None
+
+    await flush_users()
 
 async def get_user(chat_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    await ensure_user_written(chat_id)
+    async with get_db() as db:
         async with db.execute('SELECT * FROM users WHERE chat_id = ?', (chat_id,)) as cursor:
             return await cursor.fetchone()
 
-async def get_all_users():
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute('SELECT * FROM users WHERE is_active = 1') as cursor:
-            return await cursor.fetchall()
+async def iter_user_batches(columns: tuple = ('chat_id',), batch_size: int = USER_PAGE_SIZE,
+                            active_only: bool = True):
+    """Foydalanuvchilarni id bo'yicha keyset partiyalarda o'qish (faqat kerakli ustunlar)"""
+    fields = ', '.join(('id',) + tuple(column for column in columns if column != 'id'))
+    where = 'id > ? AND is_active = 1' if active_only else 'id > ?'
+    last_id = 0
+
+    while True:
+        # Ulanish partiyalar orasida pulga qaytariladi
+        async with get_db() as db:
+            async with db.execute(
+                f'SELECT {fields} FROM users WHERE {where} ORDER BY id LIMIT ?',
+                (last_id, batch_size)
+            ) as cursor:
+                rows = await cursor.fetchall()
+
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1]['id']
 
 async def search_user_by_id(chat_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    await ensure_user_written(chat_id)
+    async with get_db() as db:
         async with db.execute('SELECT * FROM users WHERE chat_id = ?', (chat_id,)) as cursor:
             return await cursor.fetchone()
 
 async def search_user_by_username(username: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_db() as db:
         async with db.execute('SELECT * FROM users WHERE username LIKE ?', (f'%{username}%',)) as cursor:
             return await cursor.fetchall()
 
 async def update_user_status(chat_id: int, is_active: int):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction() as db:
         await db.execute('UPDATE users SET is_active = ? WHERE chat_id = ?', (is_active, chat_id))
-        await db.commit()
+
+async def deactivate_users(chat_ids: list):
+    """Botni bloklagan / o'chirilgan foydalanuvchilarni bitta tranzaksiyada noaktiv qilish"""
+    if not chat_ids:
+        return
+    async with transaction() as db:
+        await db.executemany(
+            'UPDATE users SET is_active = 0 WHERE chat_id = ? AND is_active = 1',
+            [(chat_id,) for chat_id in chat_ids]
+        )
+    logger.info(f"Deactivated {len(chat_ids)} unreachable users")
 
 async def get_users_count():
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_db() as db:
         async with db.execute('SELECT COUNT(*) FROM users') as cursor:
             result = await cursor.fetchone()
             return result[0]
\ No newline at end of file
@@ -1,77 +1,103 @@
+import asyncio
 import csv
-import os
+import gzip
+import io
+import sqlite3
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
 from openpyxl import Workbook
-from services.user_service import get_all_users
-
-EXPORT_DIR = "exports"
-
-
-def ensure_export_dir():
-    if not os.path.exists(EXPORT_DIR):
-        os.makedirs(EXPORT_DIR)
-
-
-async def export_to_csv() -> str:
-    ensure_export_dir()
-    filepath = os.path.join(EXPORT_DIR, "users.csv")
-
-    users = await get_all_users()
-
-    with open(filepath, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(['ID', 'Chat ID', 'Ism', 'Familiya', 'Username', 'Qo\'shilgan sana', 'Aktiv'])
-
-        for user in users:
-            writer.writerow([
-                user['id'],
-                user['chat_id'],
-                user['first_name'],
-                user['last_name'],
-                user['username'],
-                user['joined_at'],
-                'Ha' if user['is_active'] else 'Yo\'q'
-            ])
-
-    return filepath
-
-
-async def export_to_excel() -> str:
-    ensure_export_dir()
-    filepath = os.path.join(EXPORT_DIR, "users.xlsx")
-
-    users = await get_all_users()
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Foydalanuvchilar"
-
-    # Header
-    headers = ['ID', 'Chat ID', 'Ism', 'Familiya', 'Username', 'Qo\'shilgan sana', 'Aktiv']
-    ws.append(headers)
-
-    # Data
-    for user in users:
-        ws.append([
-            user['id'],
-            user['chat_id'],
-            user['first_name'],
-            user['last_name'],
-            user['username'],
-            user['joined_at'],
-            'Ha' if user['is_active'] else 'Yo\'q'
-        ])
-
-    # Ustun kengligini sozlash
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        ws.column_dimensions[column_letter].width = max_length + 2
-
-    wb.save(filepath)
-    return filepath
\ No newline at end of file
+from openpyxl.utils import get_column_letter
+from config import DB_PATH
+from services.user_service import iter_user_batches
+
+EXPORT_COLUMNS = ('id', 'chat_id', 'first_name', 'last_name', 'username', 'joined_at', 'is_active')
+EXPORT_HEADERS = ['ID', 'Chat ID', 'Ism', 'Familiya', 'Username', 'Qo\'shilgan sana', 'Aktiv']
+# Shu hajmgacha fayl xotirada, kattasi vaqtinchalik faylga o'tadi (har so'rov uchun alohida)
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
+
+
+def _export_row(user) -> list:
+    return [
+        user['id'],
+        user['chat_id'],
+        user['first_name'],
+        user['last_name'],
+        user['username'],
+        user['joined_at'],
+        'Ha' if user['is_active'] else 'Yo\'q'
+    ]
+
+
+async def export_to_csv(compress: bool = False) -> SpooledTemporaryFile:
+    """Foydalanuvchilarni CSV ga partiyalab yozish. Boshiga qaytarilgan fayl qaytadi (yopish - chaqiruvchida)"""
+    buffer = SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    stream = gzip.GzipFile(fileobj=buffer, mode='wb') if compress else buffer
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+    try:
+        writer = csv.writer(text)
+        writer.writerow(EXPORT_HEADERS)
+
+        async for users in iter_user_batches(EXPORT_COLUMNS):
+            writer.writerows(_export_row(user) for user in users)
+
+        # Wrapper va gzip yopiladi, buffer esa ochiq qoladi
+        text.flush()
+        text.detach()
+        if compress:
+            stream.close()
+    except BaseException:
+        buffer.close()
+        raise
+
+    buffer.seek(0)
+    return buffer
+
+
+def _column_widths(conn: sqlite3.Connection) -> list:
+    """Ustun kengliklari: write-only rejimida qatorlardan oldin berilishi kerak, shuning uchun SQL agregat"""
+    row = conn.execute('''
+        SELECT MAX(LENGTH(id)), MAX(LENGTH(chat_id)), MAX(LENGTH(first_name)), MAX(LENGTH(last_name)),
+               MAX(LENGTH(username)), MAX(LENGTH(joined_at)), MAX(CASE WHEN is_active THEN 2 ELSE 4 END)
+        FROM users WHERE is_active = 1
+    ''').fetchone()
+    return [max(len(header), length or 0) + 2 for header, length in zip(EXPORT_HEADERS, row)]
+
+
+def _write_excel() -> SpooledTemporaryFile:
+    """Excel faylni alohida o'qish ulanishi orqali yozish (worker thread da ishlaydi)"""
+    conn = sqlite3.connect(Path(DB_PATH).resolve().as_uri() + '?mode=ro', uri=True)
+    conn.row_factory = sqlite3.Row
+
+    try:
+        # Kengliklar va qatorlar bitta snapshotdan olinadi
+        conn.execute('BEGIN')
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Foydalanuvchilar")
+        for index, width in enumerate(_column_widths(conn), start=1):
+            ws.column_dimensions[get_column_letter(index)].width = width
+
+        ws.append(EXPORT_HEADERS)
+        cursor = conn.execute(
+            f"SELECT {', '.join(EXPORT_COLUMNS)} FROM users WHERE is_active = 1 ORDER BY id"
+        )
+        for user in cursor:
+            ws.append(_export_row(user))
+
+        buffer = SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+        try:
+            wb.save(buffer)
+        except BaseException:
+            buffer.close()
+            raise
+    finally:
+        conn.close()
+
+    buffer.seek(0)
+    return buffer
+
+
+async def export_to_excel() -> SpooledTemporaryFile:
+    """Foydalanuvchilarni Excel ga yozish (write-only, event loop ni bloklamaydi)"""
+    return await asyncio.to_thread(_write_excel)
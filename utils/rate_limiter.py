@@ -0,0 +1,158 @@
+import asyncio
+import itertools
+import logging
+import time
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Navbatlar: kichik raqam - yuqori ustuvorlik
+PRIORITY_PAYMENT = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_BULK = 2
+
+# Chatga xabar yuboradigan / o'zgartiradigan endpointlar - faqat shular cheklanadi
+LIMITED_ENDPOINTS = frozenset({
+    'sendMessage', 'sendPhoto', 'sendVideo', 'sendDocument', 'sendAudio', 'sendVoice',
+    'sendAnimation', 'sendSticker', 'sendMediaGroup', 'sendLocation', 'sendContact',
+    'copyMessage', 'copyMessages', 'forwardMessage', 'forwardMessages',
+    'editMessageText', 'editMessageCaption', 'editMessageMedia', 'editMessageReplyMarkup',
+})
+
+
+class _Bucket:
+    """Oddiy token bucket (vaqtni o'zi hisoblaydi, kutmaydi)"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class PriorityRateLimiter(BaseRateLimiter[int]):
+    """Barcha chiquvchi xabarlar uchun yagona navbat.
+
+    Umumiy (global) va har bir chat uchun limitlarni saqlaydi; bo'sh joy
+    paydo bo'lganda avval to'lov xabarlari, keyin oddiy javoblar, oxirida
+    reklama yuboriladi. Priority `rate_limit_args` orqali beriladi.
+    """
+
+    def __init__(self, overall_rate: float = 30, chat_rate: float = 1, group_rate: float = 20 / 60,
+                 chat_burst: int = 3, max_retries: int = 2):
+        self._overall = _Bucket(overall_rate, overall_rate)
+        self._chat_rate = chat_rate
+        self._group_rate = group_rate
+        self._chat_burst = chat_burst
+        self._max_retries = max_retries
+        self._chats = {}
+        self._waiting = []
+        self._counter = itertools.count()
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._dispatcher = None
+
+    async def initialize(self):
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def shutdown(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+
+    def _chat_bucket(self, chat_id) -> _Bucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Guruh va kanallar (manfiy ID) uchun limit ancha past
+            rate = self._group_rate if isinstance(chat_id, int) and chat_id < 0 else self._chat_rate
+            bucket = self._chats[chat_id] = _Bucket(rate, self._chat_burst)
+        return bucket
+
+    def _prune_chats(self, now: float):
+        # To'lgan bucketlarni tashlab yuboramiz - xotira foydalanuvchilar soniga bog'liq bo'lmasin
+        for chat_id in [c for c, b in self._chats.items() if b.wait_time(now) == 0 and b.tokens >= b.capacity]:
+            del self._chats[chat_id]
+
+    async def _dispatch_loop(self):
+        while True:
+            self._waiting = [entry for entry in self._waiting if not entry[3].done()]
+            if not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            delay = max(self._paused_until - now, self._overall.wait_time(now))
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            # Chati bo'sh bo'lgan eng ustuvor so'rov
+            chosen = None
+            chat_delay = None
+            for entry in sorted(self._waiting):
+                chat_wait = self._chat_bucket(entry[2]).wait_time(now) if entry[2] is not None else 0.0
+                if chat_wait == 0:
+                    chosen = entry
+                    break
+                chat_delay = chat_wait if chat_delay is None else min(chat_delay, chat_wait)
+
+            if chosen is None:
+                # Hamma kutayotganlar o'z chat limitida - eng yaqinini yoki yangi so'rovni kutamiz
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=chat_delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._waiting.remove(chosen)
+            self._overall.take()
+            if chosen[2] is not None:
+                self._chat_bucket(chosen[2]).take()
+            chosen[3].set_result(None)
+
+            if len(self._chats) > 10000:
+                self._prune_chats(now)
+
+    async def _acquire(self, priority: int, chat_id):
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((priority, next(self._counter), chat_id, future))
+        self._wakeup.set()
+        await future
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint not in LIMITED_ENDPOINTS or self._dispatcher is None:
+            return await callback(*args, **kwargs)
+
+        priority = PRIORITY_INTERACTIVE if rate_limit_args is None else rate_limit_args
+        chat_id = data.get('chat_id')
+
+        attempt = 0
+        while True:
+            await self._acquire(priority, chat_id)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                # Telegram to'xtashni so'radi - barcha navbatlar kutadi
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                logger.warning(f"Flood limit on {endpoint}, pausing all sends for {e.retry_after}s")
+                attempt += 1
+                if attempt > self._max_retries:
+                    raise